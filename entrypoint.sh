@@ -0,0 +1,16 @@
+#!/bin/sh
+# Start the application server selected by FOODLOG_SERVER: runserver, wsgi or asgi
+set -e
+
+case "${FOODLOG_SERVER:-wsgi}" in
+  runserver)
+    exec python manage.py runserver "${FOODLOG_BIND:-0.0.0.0:8000}"
+    ;;
+  wsgi|asgi)
+    exec gunicorn --config gunicorn.conf.py
+    ;;
+  *)
+    echo "Unknown FOODLOG_SERVER: ${FOODLOG_SERVER}" >&2
+    exit 1
+    ;;
+esac
@@ -2,35 +2,126 @@ import logging
 import datetime
 
 from django import forms
-from django.contrib import admin
+from django.contrib import admin, messages
+from django.contrib.admin import helpers
+from django.contrib.admin.widgets import AdminDateWidget, AutocompleteSelect, AutocompleteSelectMultiple
+from django.db.models import Prefetch, Q, Subquery, Value
+from django.db.models.functions import Coalesce
 from django.http import HttpResponseRedirect
-from django.urls import reverse
-from django.utils.html import format_html
+from django.template.response import TemplateResponse
+from django.urls import path, reverse
+from django.utils.html import format_html, format_html_join
 from django.utils.safestring import mark_safe
-from .models import DailyIntake, Day, Dish, Meal, MealTitle, Note, Pill, Product, TakingPill
+from .caches import calendar_cache, day_table_cache, default_intake_cache, pill_adherence_cache
+from .models import TOTAL_PARAMS, DailyIntake, Day, Dish, Meal, MealTitle, Note, Pill, Product, TakingPill
+from .planner import plan_day
+from .services import apply_day_template, copy_day, save_meal_plan
+from .similar import product_index
+from .stats import PERIODS, fraction_band, nutrition_stats
 
 logger = logging.getLogger(__name__)
 
-admin.site.register(MealTitle)
-admin.site.register(Pill)
-
 
 class DayCopyForm(forms.ModelForm):
+    COPY_SHORTCUTS = {"yesterday": 1, "last_week": 7}
+
     copy_from = forms.ModelChoiceField(
-        queryset=Day.objects.order_by("-date").all(),
+        queryset=Day.objects.all(),
+        # Days are looked up page by page through DayAdmin search, any Day FK can describe the relation
+        widget=AutocompleteSelect(Meal._meta.get_field("day"), admin.site),
         required=False,
         label="Copy meals from Day",
         help_text="Select an existing Day to copy meals and dishes from."
     )
+    copy_shortcut = forms.ChoiceField(
+        choices=[("", "---------"), ("yesterday", "Previous day"), ("last_week", "Same weekday last week")],
+        required=False,
+        label="Or copy from",
+        help_text="Copy from the Day before the new one or a week before it, if no Day is selected above."
+    )
 
     class Meta:
         model = Day
         fields = '__all__'  # All model fields
 
+    def clean(self):
+        cleaned_data = super().clean()
+        shortcut, date = cleaned_data.get("copy_shortcut"), cleaned_data.get("date")
+        if shortcut and date and not cleaned_data.get("copy_from"):
+            source_date = date - datetime.timedelta(days=self.COPY_SHORTCUTS[shortcut])
+            cleaned_data["copy_from"] = Day.objects.filter(date=source_date).first()
+            if cleaned_data["copy_from"] is None:
+                self.add_error("copy_shortcut", f"There is no Day {source_date} to copy from.")
+        return cleaned_data
+
+
+class DayTemplateForm(forms.Form):
+    MAX_DAYS = 366
+
+    date_from = forms.DateField(label="From", widget=AdminDateWidget)
+    date_to = forms.DateField(label="To", widget=AdminDateWidget)
+    skip_filled = forms.BooleanField(
+        required=False,
+        initial=True,
+        label="Skip filled days",
+        help_text="Do not copy to days that already have meals or pill takings."
+    )
+
+    def clean(self):
+        cleaned_data = super().clean()
+        date_from, date_to = cleaned_data.get("date_from"), cleaned_data.get("date_to")
+        if date_from and date_to:
+            if date_from > date_to:
+                raise forms.ValidationError("Start date must not be after end date.")
+            if (date_to - date_from).days >= self.MAX_DAYS:
+                raise forms.ValidationError(f"Range must not exceed {self.MAX_DAYS} days.")
+        return cleaned_data
+
+    def dates(self) -> list:
+        date_from = self.cleaned_data["date_from"]
+        return [date_from + datetime.timedelta(days=n)
+                for n in range((self.cleaned_data["date_to"] - date_from).days + 1)]
+
+
+class NutritionStatsForm(forms.Form):
+    period = forms.ChoiceField(choices=[(period, period.capitalize()) for period in PERIODS], initial="month")
+    date_from = forms.DateField(label="From", required=False, widget=AdminDateWidget)
+    date_to = forms.DateField(label="To", required=False, widget=AdminDateWidget)
+    window = forms.IntegerField(label="Moving average window", min_value=1, max_value=52, initial=3,
+                                help_text="Number of periods to average over.")
+
+
+class PillAdherenceForm(forms.Form):
+    period = forms.ChoiceField(choices=[(period, period.capitalize()) for period in PERIODS], initial="month")
+    date_from = forms.DateField(label="From", required=False, widget=AdminDateWidget)
+    date_to = forms.DateField(label="To", required=False, widget=AdminDateWidget)
+
+
+class MealPlanForm(forms.Form):
+    products = forms.ModelMultipleChoiceField(
+        queryset=Product.objects.all(),
+        widget=AutocompleteSelectMultiple(Dish._meta.get_field("product"), admin.site),
+        required=False,
+        label="Candidate products",
+        help_text="Products the plan may use, all products if none are selected."
+    )
+    lactose_free_only = forms.BooleanField(required=False, label="Lactose-free only")
+    max_dishes = forms.IntegerField(label="Max dishes", min_value=1, max_value=20, initial=6)
+    max_weight = forms.IntegerField(label="Max weight of a dish", min_value=10, max_value=2000, initial=400)
+    date = forms.DateField(label="Day", widget=AdminDateWidget, initial=datetime.date.today)
+    title = forms.ModelChoiceField(
+        queryset=MealTitle.objects.all(),
+        widget=AutocompleteSelect(Meal._meta.get_field("title"), admin.site),
+        required=False,
+        label="Meal",
+        help_text="Meal to save the proposed dishes to."
+    )
+
 
 class DishInline(admin.TabularInline):  # Or admin.StackedInline for vertical display
     model = Dish
     extra = 1  # Number of empty rows for adding new records
+    autocomplete_fields = ('product',)
 
 
 class MealInline(admin.TabularInline):
@@ -38,12 +129,14 @@ class MealInline(admin.TabularInline):
     extra = 1
     inlines = [DishInline]  # Nested inlines for displaying Dish within Meal
     ordering = ('time', 'id')
+    autocomplete_fields = ('title',)
 
 
 class TakingPillInline(admin.TabularInline):  # Or admin.StackedInline for vertical display
     model = TakingPill
     extra = 1  # Number of empty rows for adding new records
     ordering = ('time', 'pill')
+    autocomplete_fields = ('pill',)
 
 
 class NoteInline(admin.TabularInline):  # Or admin.StackedInline for vertical display
@@ -52,35 +145,196 @@ class NoteInline(admin.TabularInline):  # Or admin.StackedInline for vertical di
     ordering = ('time',)
 
 
+@admin.register(MealTitle)
+class MealTitleAdmin(admin.ModelAdmin):
+    search_fields = ("title",)
+
+
+@admin.register(Pill)
+class PillAdmin(admin.ModelAdmin):
+    search_fields = ("title",)
+
+    def get_urls(self):
+        """
+        Adherence report next to the changelist
+        """
+
+        return [
+            path("adherence/", self.admin_site.admin_view(self.adherence_view), name="foodlog_pill_adherence"),
+        ] + super().get_urls()
+
+    def adherence_view(self, request):
+        """
+        Taken ratio per period, current streaks and missed doses by time of day of all pills
+        """
+
+        form = PillAdherenceForm(request.GET or {"period": "month"})
+        pills = []
+        if form.is_valid():
+            pills = pill_adherence_cache.get(form.cleaned_data["period"], form.cleaned_data["date_from"],
+                                             form.cleaned_data["date_to"])
+
+        return TemplateResponse(request, "admin/foodlog/pill/adherence.html", {
+            **self.admin_site.each_context(request),
+            "title": "Pill adherence",
+            "opts": self.model._meta,
+            "form": form,
+            "pills": pills,
+            "media": self.media + form.media,
+        })
+
+    def change_view(self, request, object_id, form_url="", extra_context=None):
+        extra_context = extra_context or {}
+        if object_id and object_id.isdigit():
+            # The last 12 weeks, current week included
+            date_from = datetime.date.today() - datetime.timedelta(weeks=11, days=datetime.date.today().weekday())
+            extra_context["adherence"] = next(iter(pill_adherence_cache.get("week", date_from,
+                                                                            pill_ids=[int(object_id)])), None)
+        return super().change_view(request, object_id, form_url, extra_context)
+
+
 @admin.register(DailyIntake)
 class DailyIntakeAdmin(admin.ModelAdmin):
     list_display = ('title', 'default', 'energy', 'proteins', 'fats', 'carbs')
 
     ordering = ('-default', '-id')
 
+    actions = ['propose_meal_plan']
+
+    @admin.action(description="Propose dishes for selected Daily Intake")
+    def propose_meal_plan(self, request, queryset):
+        """
+        Propose dish weights hitting the intake targets, and save them as a meal on request
+        """
+
+        if queryset.count() != 1:
+            self.message_user(request, "Select exactly one Daily Intake.", messages.WARNING)
+            return None
+
+        intake = queryset.first()
+        submitted = "propose" in request.POST or "save" in request.POST
+        form = MealPlanForm(request.POST if submitted else None)
+        plan = None
+        if form.is_valid():
+            plan = plan_day(intake, [product.pk for product in form.cleaned_data["products"]],
+                            form.cleaned_data["lactose_free_only"], form.cleaned_data["max_dishes"],
+                            form.cleaned_data["max_weight"])
+            if "save" in request.POST:
+                if not form.cleaned_data["title"]:
+                    form.add_error("title", "Select a meal to save the dishes to.")
+                elif not plan["dishes"]:
+                    form.add_error(None, "There are no dishes to save.")
+                else:
+                    meal = save_meal_plan(form.cleaned_data["date"], form.cleaned_data["title"], plan["dishes"],
+                                          daily_intake=intake)
+                    self.message_user(request, f"Saved {len(plan['dishes'])} dishes to {meal}.", messages.SUCCESS)
+                    return HttpResponseRedirect(reverse("admin:foodlog_day_change", args=[meal.day_id]))
+
+        return TemplateResponse(request, "admin/foodlog/dailyintake/meal_plan.html", {
+            **self.admin_site.each_context(request),
+            "title": f"Propose dishes for {intake}",
+            "opts": self.model._meta,
+            "intake": intake,
+            "form": form,
+            "plan": plan,
+            "media": self.media + form.media,
+            "action_checkbox_name": helpers.ACTION_CHECKBOX_NAME,
+        })
+
 
 def _colored_param(value, real_param, need_param, total=None):
     """
     Colored parameter
     """
 
-    fraction = real_param / need_param
-    status = "fl-good-color"
-    if fraction > 1.10:
-        status = "fl-fraction-more-110-color"
-    elif fraction > 1.05:
-        status = "fl-fraction-more-105-color"
-    elif fraction < 0.90:
-        status = "fl-fraction-less-090-color"
-    elif fraction < 0.95:
-        status = "fl-fraction-less-095-color"
-
-    result = format_html('<span class="{}">{}</span>', status, value)
+    result = format_html('<span class="{}">{}</span>', fraction_band(real_param / need_param), value)
     if total is not None:
         result = format_html('{} / {}', result, total)
     return result
 
 
+CALENDAR_CELL = 12
+CALENDAR_LEFT = 30
+CALENDAR_TOP = 15
+
+
+def _calendar_year(year: int, days: list, param: str) -> dict:
+    """
+    SVG cells of the year colored by the ratio of the parameter to the daily intake, a column per week, Monday on top
+    """
+
+    start = datetime.date(year, 1, 1)
+    first_monday = start - datetime.timedelta(days=start.weekday())
+    logged = {row["date"]: row for row in days}
+    cells, months, on_target = [], [], 0
+    date = start
+    while date.year == year:
+        x = CALENDAR_LEFT + (date - first_monday).days // 7 * CALENDAR_CELL
+        if date.day == 1:
+            months.append({"x": x, "label": date.strftime("%b")})
+
+        row = logged.get(date)
+        title = date.isoformat()
+        band = "fl-no-data"
+        if row is not None:
+            ratio = row[f"{param}_ratio"]
+            if ratio is None:
+                band = "fl-no-target"
+                title = f"{title}: {param} {row[param]:.0f}, no target"
+            else:
+                band = fraction_band(ratio)
+                on_target += band == "fl-good-color"
+                title = f"{title}: {param} {row[param]:.0f} of {row[f'{param}_target']:.0f} ({ratio:.0%})"
+        cells.append((x, CALENDAR_TOP + date.weekday() * CALENDAR_CELL, band, title))
+        date += datetime.timedelta(days=1)
+
+    return {
+        "year": year,
+        # Hundreds of cells a year are joined here, rendering them by template tags takes much longer
+        "cells": format_html_join(
+            "", '<rect x="{}" y="{}" width="10" height="10" class="{}"><title>{}</title></rect>', cells
+        ),
+        "months": months,
+        "logged": len(days),
+        "on_target": on_target,
+        "width": CALENDAR_LEFT + 54 * CALENDAR_CELL,
+        "height": CALENDAR_TOP + 7 * CALENDAR_CELL,
+    }
+
+
+def _load_day_items(day: Day) -> list:
+    """
+    Meals with dishes, pill takings and notes of the day loaded by a constant number of queries.
+    Totals of meals and the day are computed in one pass and stored as `total_*` attributes.
+    """
+
+    meals = list(
+        day.meal_set
+        .select_related("title")
+        .prefetch_related(Prefetch("dish_set", queryset=Dish.objects.select_related("product").order_by("id")))
+        .order_by("time", "id")
+    )
+
+    params = TOTAL_PARAMS + ("weight",)
+    day_totals = dict.fromkeys(params, 0)
+    for meal in meals:
+        meal_totals = dict.fromkeys(params, 0)
+        for dish in meal.dish_set.all():
+            for param in params:
+                meal_totals[param] += getattr(dish, param)
+        for param in params:
+            setattr(meal, f"total_{param}", meal_totals[param])
+            day_totals[param] += getattr(meal, param)
+    for param in params:
+        setattr(day, f"total_{param}", day_totals[param])
+
+    items = []
+    items.extend(meals)
+    items.extend(day.takingpill_set.select_related("pill").order_by('time', 'id'))
+    items.extend(day.note_set.order_by('time', 'id'))
+    return items
+
+
 @admin.register(Day)
 class DayAdmin(admin.ModelAdmin):
 
@@ -93,8 +347,69 @@ class DayAdmin(admin.ModelAdmin):
 
     ordering = ('-date',)
 
+    search_fields = ('date',)
+
     inlines = [TakingPillInline, NoteInline, MealInline]
 
+    actions = ['apply_as_template']
+
+    def get_queryset(self, request):
+        """
+        Days with totals from the rollup
+        """
+
+        return super().get_queryset(request).select_related('daily_intake').with_rollup()
+
+    def get_urls(self):
+        """
+        Nutrition statistics and adherence calendar next to the changelist
+        """
+
+        return [
+            path("stats/", self.admin_site.admin_view(self.stats_view), name="foodlog_day_stats"),
+            path("calendar/", self.admin_site.admin_view(self.calendar_view), name="foodlog_day_calendar"),
+        ] + super().get_urls()
+
+    def stats_view(self, request):
+        """
+        Weekly, monthly or yearly averages of energy and macros with adherence to the daily intake
+        """
+
+        form = NutritionStatsForm(request.GET or {"period": "month", "window": 3})
+        rows = []
+        if form.is_valid():
+            rows = nutrition_stats(form.cleaned_data["period"], form.cleaned_data["date_from"],
+                                   form.cleaned_data["date_to"], form.cleaned_data["window"])
+
+        return TemplateResponse(request, "admin/foodlog/day/stats.html", {
+            **self.admin_site.each_context(request),
+            "title": "Nutrition statistics",
+            "opts": self.model._meta,
+            "form": form,
+            "rows": rows,
+            "media": self.media + form.media,
+        })
+
+    def calendar_view(self, request):
+        """
+        Heatmap of daily energy or macros against the daily intake over all years, cached per year
+        """
+
+        param = request.GET.get("param", "energy")
+        if param not in TOTAL_PARAMS:
+            param = "energy"
+
+        return TemplateResponse(request, "admin/foodlog/day/calendar.html", {
+            **self.admin_site.each_context(request),
+            "title": "Adherence calendar",
+            "opts": self.model._meta,
+            "param": param,
+            "params": TOTAL_PARAMS,
+            "years": [_calendar_year(year, days, param) for year, days in calendar_cache.get().items()],
+            "weekdays": [{"y": CALENDAR_TOP + n * CALENDAR_CELL + 9, "label": label}
+                         for n, label in enumerate(["Mon", "", "Wed", "", "Fri", "", ""]) if label],
+        })
+
     def get_form(self, request, obj=None, **kwargs):
         """
         Form with copy functionality for adding new Day
@@ -113,36 +428,38 @@ class DayAdmin(admin.ModelAdmin):
 
         copy_from = form.cleaned_data.get('copy_from')
         if copy_from and not change:
-            for meal in copy_from.meal_set.order_by('time', 'id').all():
-                logger.debug("Copy meal: %s", meal)
-                new_meal = Meal.objects.create(
-                    day=obj,
-                    title=meal.title,
-                    time=meal.time,
-                )
-                new_dishes = []
-                for dish in meal.dish_set.order_by('id').all():
-                    logger.debug("Copy dish: %s", dish)
-                    new_dishes.append(Dish.objects.create(
-                        meal=new_meal,
-                        product=dish.product,
-                        weight=dish.weight,
-                        note=dish.note,
-                    ))
-
-            for takingpill in copy_from.takingpill_set.order_by('time', 'id').all():
-                logger.debug("Copy meal: %s", takingpill)
-                TakingPill.objects.create(
-                    day=obj,
-                    pill=takingpill.pill,
-                    time=takingpill.time,
-                    is_taken=False,
-                    note=takingpill.note,
-                )
+            copy_day(copy_from, obj)
+
+    @admin.action(description="Apply selected Day as template to a date range")
+    def apply_as_template(self, request, queryset):
+        """
+        Copy meals, dishes and pill schedule of the selected Day to every day of the range
+        """
+
+        if queryset.count() != 1:
+            self.message_user(request, "Select exactly one Day to use as template.", messages.WARNING)
+            return None
+
+        source = queryset.first()
+        form = DayTemplateForm(request.POST if "apply" in request.POST else None)
+        if form.is_valid():
+            days = apply_day_template(source, form.dates(), skip_filled=form.cleaned_data["skip_filled"])
+            self.message_user(request, f"Copied {source} to {len(days)} days.", messages.SUCCESS)
+            return None
+
+        return TemplateResponse(request, "admin/foodlog/day/apply_template.html", {
+            **self.admin_site.each_context(request),
+            "title": f"Apply {source} as template",
+            "opts": self.model._meta,
+            "source": source,
+            "form": form,
+            "media": self.media + form.media,
+            "action_checkbox_name": helpers.ACTION_CHECKBOX_NAME,
+        })
 
     def formfield_for_foreignkey(self, db_field, request, **kwargs):
         if db_field.name == 'daily_intake':
-            default_intake = DailyIntake.objects.filter(default=True).first()
+            default_intake = default_intake_cache.get()
             if default_intake:
                 kwargs['initial'] = default_intake.id
         return super().formfield_for_foreignkey(db_field, request, **kwargs)
@@ -205,7 +522,17 @@ class DayAdmin(admin.ModelAdmin):
     @admin.display(description="Dishes")
     def meals_and_dishes(self, obj: Day) -> str:
         """
-        Display meals and dishes
+        Display meals and dishes, cached until anything shown in the table changes
+        """
+
+        if obj.pk is None:
+            return "-"
+
+        return day_table_cache.get_or_render(obj, lambda: self._render_meals_and_dishes(obj))
+
+    def _render_meals_and_dishes(self, obj: Day) -> str:
+        """
+        Render table of meals and dishes
         """
 
         day_url = reverse("admin:foodlog_day_change", args=[obj.pk])
@@ -226,7 +553,7 @@ class DayAdmin(admin.ModelAdmin):
                 f'<td>&nbsp;</td>'
                 f'</tr>'
             )
-            for dish in meal.dish_set.order_by("id").all():
+            for dish in meal.dish_set.all():
 
                 dish_url = reverse("admin:foodlog_dish_change", args=[dish.pk])
                 dish_a = format_html('<a href="{}?next={}">{}</a>', dish_url, day_url, dish.product.title)
@@ -267,10 +594,7 @@ class DayAdmin(admin.ModelAdmin):
                 f'</tr>'
             )
 
-        items = []
-        items.extend(obj.meal_set.order_by("time", "id").all())
-        items.extend(obj.takingpill_set.order_by('time', 'id').all())
-        items.extend(obj.note_set.order_by('time', 'id').all())
+        items = _load_day_items(obj)
         items.sort(key=lambda i: (i.time if i.time else datetime.datetime.now().time()))
         for item in items:
             if isinstance(item, Meal):
@@ -335,23 +659,82 @@ class DayAdmin(admin.ModelAdmin):
 class MealAdmin(admin.ModelAdmin):
     list_display = ('day', 'title', 'time', 'energy', 'proteins', 'fats', 'carbs', 'weight')
 
-    list_filter = ("day", "title")
+    list_filter = (("day__date", admin.DateFieldListFilter), "title")
+
+    search_fields = ("title__title", "day__date")
+
+    autocomplete_fields = ("title", "day")
 
     readonly_fields = ('energy', 'proteins', 'fats', 'carbs', 'weight')
 
     inlines = [DishInline]
 
+    def get_queryset(self, request):
+        """
+        Meals with totals aggregated in SQL
+        """
+
+        return super().get_queryset(request).select_related('day', 'title').with_totals()
+
     def response_change(self, request, obj):
         if "_save" in request.POST and request.GET.get("next"):
             return HttpResponseRedirect(request.GET.get("next"))
         return super().response_change(request, obj)
 
 
+class RecentRelatedListFilter(admin.RelatedFieldListFilter):
+    """
+    Choices of the latest `days` logged days and the selected ones, not of the whole journal
+    """
+
+    days = 7
+
+    def since(self):
+        """
+        Date of the earliest of the latest logged days
+        """
+
+        latest = Day.objects.order_by("-date").values("date")[self.days - 1:self.days]
+        return Coalesce(Subquery(latest), Value(datetime.date.min))
+
+    def selected(self) -> list:
+        return [value for value in self.lookup_val or [] if value.isdigit()]
+
+
+class MealListFilter(RecentRelatedListFilter):
+    def field_choices(self, field, request, model_admin):
+        """
+        Meals with their days and titles loaded by one query
+        """
+
+        meals = (Meal.objects.select_related("day", "title")
+                 .filter(Q(day__date__gte=self.since()) | Q(pk__in=self.selected()))
+                 .order_by("-day__date", "time"))
+        return [(meal.pk, str(meal)) for meal in meals]
+
+
+class ProductListFilter(RecentRelatedListFilter):
+    def field_choices(self, field, request, model_admin):
+        """
+        Products of dishes of the latest days by one query
+        """
+
+        recent = Dish.objects.filter(meal__day__date__gte=self.since()).values("product_id")
+        return list(Product.objects.filter(Q(pk__in=recent) | Q(pk__in=self.selected()))
+                    .order_by("title").values_list("pk", "title"))
+
+
 @admin.register(Dish)
 class DishAdmin(admin.ModelAdmin):
     list_display = ('product', 'weight', 'meal')
 
-    list_filter = ("product", "meal")
+    list_select_related = ('product', 'meal__day', 'meal__title')
+
+    readonly_fields = ('energy', 'proteins', 'fats', 'carbs', 'sugar', 'salt')
+
+    list_filter = (("product", ProductListFilter), ("meal", MealListFilter))
+
+    autocomplete_fields = ("product", "meal")
 
     def response_change(self, request, obj):
         if "_save" in request.POST and request.GET.get("next"):
@@ -375,14 +758,22 @@ class ProductAdmin(admin.ModelAdmin):
 
         return obj.lactose_free
 
+    def change_view(self, request, object_id, form_url="", extra_context=None):
+        extra_context = extra_context or {}
+        if object_id and object_id.isdigit():
+            extra_context["similar_products"] = product_index.nearest(int(object_id), k=10)
+        return super().change_view(request, object_id, form_url, extra_context)
+
 
 @admin.register(TakingPill)
 class TakingPillAdmin(admin.ModelAdmin):
     list_display = ('pill', 'day', 'time', 'is_taken', 'note')
 
-    list_filter = ("pill", "day")
+    list_filter = ("pill", ("day__date", admin.DateFieldListFilter))
+
+    search_fields = ("pill__title",)
 
-    search_fields = ("pill",)
+    autocomplete_fields = ("pill", "day")
 
     ordering = ('-day', '-time', 'pill')
 
@@ -394,12 +785,14 @@ class TakingPillAdmin(admin.ModelAdmin):
 
 @admin.register(Note)
 class NoteAdmin(admin.ModelAdmin):
-    list_filter = ("day",)
+    list_filter = (("day__date", admin.DateFieldListFilter),)
 
     ordering = ('-day', '-time')
 
     search_fields = ("note",)
 
+    autocomplete_fields = ("day",)
+
     def response_change(self, request, obj):
         if "_save" in request.POST and request.GET.get("next"):
             return HttpResponseRedirect(request.GET.get("next"))
@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class FoodlogConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'foodlog'
+
+    def ready(self):
+        from . import signals  # noqa: F401
@@ -0,0 +1,79 @@
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+from django.core.cache import cache
+from django.db import router
+
+# Permission caches set on the user by ModelBackend
+PERM_CACHES = ("_perm_cache", "_user_perm_cache", "_group_perm_cache")
+
+
+def user_cache_key(user_id) -> str:
+    return f"foodlog:auth:user-state:{user_id}"
+
+
+def _cached_fields() -> list:
+    return [field.attname for field in get_user_model()._meta.concrete_fields if field.attname != "password"]
+
+
+def user_state(user) -> dict:
+    """
+    What authentication needs of the user: fields except the password, the session hash and permissions
+    """
+
+    return {
+        "values": [getattr(user, field) for field in _cached_fields()],
+        "session_hash": user.get_session_auth_hash(),
+        **{name: getattr(user, name) for name in PERM_CACHES if hasattr(user, name)},
+    }
+
+
+def user_from_state(state: dict):
+    """
+    User of the cached state. The password is deferred: it's loaded on access and `save()` skips it,
+    the session hash is the cached one until the password is loaded or changed.
+    """
+
+    user_model = get_user_model()
+    user = user_model.from_db(router.db_for_read(user_model), _cached_fields(), state["values"])
+    for name in PERM_CACHES:
+        if name in state:
+            setattr(user, name, state[name])
+
+    def get_session_auth_hash():
+        if "password" in user.__dict__:
+            return user_model.get_session_auth_hash(user)
+        return state["session_hash"]
+
+    user.get_session_auth_hash = get_session_auth_hash
+    return user
+
+
+class CachedModelBackend(ModelBackend):
+    """
+    Model backend reading users of the session from the cache.
+
+    The user is cached with its permissions already loaded, so neither the authentication middleware nor
+    the admin permission checks query the database. The password hash isn't cached, only the session hash
+    derived from it. Signals drop the entry when the user, its groups or permissions change.
+    """
+
+    def get_user(self, user_id):
+        key = user_cache_key(user_id)
+        state = cache.get(key)
+        if state is None:
+            user = super().get_user(user_id)
+            if user is None:
+                return None
+            self.get_all_permissions(user)
+            cache.set(key, user_state(user), timeout=getattr(settings, "AUTH_USER_CACHE_TIMEOUT", 300))
+            return user
+        return user_from_state(state)
+
+
+def invalidate_users(user_ids) -> None:
+    """
+    Drop cached users
+    """
+
+    cache.delete_many([user_cache_key(user_id) for user_id in set(user_ids)])
@@ -0,0 +1,403 @@
+import datetime
+import hashlib
+import logging
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models import Count, Max, OuterRef, Subquery
+from django.db.models.functions import ExtractYear
+from django.utils.safestring import mark_safe
+
+from .models import ROLLUP_PARAMS, DailyIntake, Day, Dish, Meal, Note, Pill, Product, TakingPill
+from .stats import calendar_days, pill_adherence
+
+logger = logging.getLogger(__name__)
+
+PRODUCT_NUTRIENTS = ROLLUP_PARAMS + ("lactose_free",)
+
+
+def shared_version(cache, key: str) -> str:
+    """
+    Current version stored under the key. A missing version, never set or evicted, is replaced by a new one,
+    so it can't fall back to a value entries were already cached under.
+    """
+
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, uuid.uuid4().hex, timeout=None)
+        version = cache.get(key)
+    return version
+
+
+def bump_version(cache, key: str) -> str:
+    """
+    Replace the version stored under the key by a new one. Versions are random rather than counted:
+    `incr()` of most backends stores the result with the default timeout, and a counter starting over
+    after expiry would repeat versions of live entries.
+    """
+
+    version = uuid.uuid4().hex
+    cache.set(key, version, timeout=None)
+    return version
+
+
+class ProductCache:
+    """
+    Size-bounded LRU cache of product nutrients keyed by product id.
+
+    Entries live in the process. If a Django cache alias is configured, it holds the shared generation of
+    the cache (bumped on every invalidation) and a second tier of entries, so several workers stay coherent:
+    a worker drops its local entries once it sees a new generation, at most `check_interval` seconds late.
+    Shared entries of old generations are never read again and expire after `timeout` seconds.
+    """
+
+    GENERATION_KEY = "foodlog:products:generation"
+
+    def __init__(self, maxsize: int, alias: str | None = None, check_interval: float = 1.0,
+                 timeout: int | None = 3600):
+        self.maxsize = maxsize
+        self.alias = alias
+        self.check_interval = check_interval
+        self.timeout = timeout
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._generation = None
+        self._checked_at = 0.0
+
+    @property
+    def shared(self):
+        return caches[self.alias] if self.alias else None
+
+    def get(self, product_id: int) -> dict | None:
+        """
+        Nutrients of the product, None if there is no such product
+        """
+
+        self._sync_generation()
+        with self._lock:
+            nutrients = self._entries.get(product_id)
+            if nutrients is not None:
+                self._entries.move_to_end(product_id)
+                return nutrients
+
+        shared_key = self._shared_key(product_id)
+        nutrients = self.shared.get(shared_key) if self.shared else None
+        if nutrients is None:
+            nutrients = Product.objects.filter(id=product_id).values(*PRODUCT_NUTRIENTS).first()
+            if nutrients is None:
+                return None
+            if self.shared:
+                self.shared.set(shared_key, nutrients, timeout=self.timeout)
+
+        with self._lock:
+            self._entries[product_id] = nutrients
+            self._entries.move_to_end(product_id)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        return nutrients
+
+    def invalidate(self, product_id: int | None = None) -> None:
+        """
+        Drop the product (or all products) from the local cache and make other workers drop their copies
+        """
+
+        with self._lock:
+            if product_id is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(product_id, None)
+
+        if self.shared:
+            self._generation = bump_version(self.shared, self.GENERATION_KEY)
+            self._checked_at = time.monotonic()
+
+    def _sync_generation(self) -> None:
+        """
+        Clear local entries if another worker has invalidated the cache
+        """
+
+        if not self.shared or time.monotonic() - self._checked_at < self.check_interval:
+            return
+
+        generation = shared_version(self.shared, self.GENERATION_KEY)
+        self._checked_at = time.monotonic()
+        if generation != self._generation:
+            if self._generation is not None:
+                logger.debug("Product cache generation changed to %s", generation)
+            with self._lock:
+                self._entries.clear()
+            self._generation = generation
+
+    def _shared_key(self, product_id: int) -> str:
+        return f"foodlog:products:{self._generation or 0}:{product_id}"
+
+
+def _day_subquery(queryset, day_path: str, aggregate):
+    """
+    Scalar subquery aggregating rows of the outer day
+    """
+
+    return Subquery(
+        queryset.filter(**{day_path: OuterRef("pk")}).order_by().values(day_path).annotate(value=aggregate)
+        .values("value")
+    )
+
+
+class DayTableCache:
+    """
+    Cache of the rendered day table.
+
+    Fragments are keyed by a version of the day derived from the latest `updated_at` and row counts of
+    everything shown in the table. The version itself is cached too and dropped by signals on changes,
+    so an untouched day renders with no queries at all.
+    """
+
+    def __init__(self, alias: str, timeout: int | None):
+        self.alias = alias
+        self.timeout = timeout
+
+    @property
+    def cache(self):
+        return caches[self.alias]
+
+    def get_or_render(self, day: Day, render) -> str:
+        """
+        Cached fragment of the day, rendered by `render()` on miss
+        """
+
+        version_key = self._version_key(day.pk)
+        version = self.cache.get(version_key)
+        if version is None:
+            version = self._derive_version(day.pk)
+            self.cache.set(version_key, version, timeout=self.timeout)
+
+        fragment_key = f"foodlog:day:{day.pk}:table:{version}"
+        fragment = self.cache.get(fragment_key)
+        if fragment is not None:
+            logger.debug("Day table cache hit for %s", day)
+            return mark_safe(fragment)
+
+        logger.debug("Day table cache miss for %s", day)
+        fragment = render()
+        self.cache.set(fragment_key, str(fragment), timeout=self.timeout)
+        return fragment
+
+    def invalidate(self, day_ids) -> None:
+        """
+        Drop cached versions of the days, so their fragments are looked up by a fresh version.
+        Dropped now and once more after commit, so a concurrent render can't cache a version derived
+        from data before the transaction is committed.
+        """
+
+        keys = [self._version_key(day_id) for day_id in set(day_ids)]
+        self.cache.delete_many(keys)
+        transaction.on_commit(lambda: self.cache.delete_many(keys))
+
+    @staticmethod
+    def _version_key(day_id: int) -> str:
+        return f"foodlog:day:{day_id}:version"
+
+    @staticmethod
+    def _derive_version(day_id: int) -> str:
+        """
+        Version of everything shown in the day table, by a single query
+        """
+
+        values = Day.objects.filter(pk=day_id).values_list(
+            "updated_at",
+            "daily_intake__updated_at",
+            _day_subquery(Meal.objects, "day", Max("updated_at")),
+            _day_subquery(Meal.objects, "day", Count("id")),
+            _day_subquery(Meal.objects, "day", Max("title__updated_at")),
+            _day_subquery(Dish.objects, "meal__day", Max("updated_at")),
+            _day_subquery(Dish.objects, "meal__day", Count("id")),
+            _day_subquery(Dish.objects, "meal__day", Max("product__updated_at")),
+            _day_subquery(TakingPill.objects, "day", Max("updated_at")),
+            _day_subquery(TakingPill.objects, "day", Count("id")),
+            _day_subquery(TakingPill.objects, "day", Max("pill__updated_at")),
+            _day_subquery(Note.objects, "day", Max("updated_at")),
+            _day_subquery(Note.objects, "day", Count("id")),
+        ).first()
+        return hashlib.md5(repr(values).encode()).hexdigest()
+
+
+class DefaultIntakeCache:
+    """
+    Cache of the default daily intake.
+
+    The intake is kept in the process and, through the Django cache alias, shared between workers by a
+    version bumped on every change of any intake. The version is checked at most every `check_interval`
+    seconds, so reading the default costs no queries and usually no cache round trip either.
+    """
+
+    VERSION_KEY = "foodlog:daily_intake:default:version"
+
+    def __init__(self, alias: str, check_interval: float = 1.0):
+        self.alias = alias
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._entry = None
+        self._checked_at = 0.0
+
+    @property
+    def cache(self):
+        return caches[self.alias]
+
+    def get(self) -> DailyIntake | None:
+        """
+        Default daily intake, None if there are no intakes
+        """
+
+        entry = self._entry
+        if entry is not None and time.monotonic() - self._checked_at < self.check_interval:
+            return entry[1]
+
+        version = shared_version(self.cache, self.VERSION_KEY)
+        self._checked_at = time.monotonic()
+        if entry is not None and entry[0] == version:
+            return entry[1]
+
+        intake = DailyIntake.objects.filter(default=True).first()
+        with self._lock:
+            self._entry = (version, intake)
+        return intake
+
+    def invalidate(self) -> None:
+        """
+        Drop the cached default here and in other workers
+        """
+
+        with self._lock:
+            self._entry = None
+        bump_version(self.cache, self.VERSION_KEY)
+
+
+class CalendarCache:
+    """
+    Cache of the adherence calendar, per year.
+
+    A year is keyed by a version derived from the latest `updated_at` of its days, day totals and daily intakes
+    and their counts, all years by one grouped query. A change to any day of a year changes only the key of that
+    year, so the calendar of many years is recomputed for changed years only, by one more query.
+    """
+
+    def __init__(self, alias: str, timeout: int | None):
+        self.alias = alias
+        self.timeout = timeout
+
+    @property
+    def cache(self):
+        return caches[self.alias]
+
+    def get(self, years=None) -> dict:
+        """
+        Logged days of the years (all years with days by default) grouped by year, latest year first
+        """
+
+        versions = self._derive_versions()
+        years = sorted(versions if years is None else set(years) & set(versions), reverse=True)
+        # v2: rows carry `<param>_target`, years cached before have to be computed again
+        keys = {year: f"foodlog:calendar:v2:{year}:{versions[year]}" for year in years}
+        cached = self.cache.get_many(keys.values())
+
+        result = {year: cached.get(key) for year, key in keys.items()}
+        missing = [year for year, days in result.items() if days is None]
+        if missing:
+            logger.debug("Calendar cache miss for %s", missing)
+            computed = calendar_days(missing)
+            self.cache.set_many({keys[year]: days for year, days in computed.items()}, timeout=self.timeout)
+            result.update(computed)
+        return result
+
+    @staticmethod
+    def _derive_versions() -> dict:
+        """
+        Version of each year with days, by a single grouped query
+        """
+
+        rows = (Day.objects.order_by()
+                .annotate(year=ExtractYear("date"))
+                .values("year")
+                .annotate(days=Count("id"), intakes=Count("daily_intake"), day_updated_at=Max("updated_at"),
+                          totals_updated_at=Max("totals__updated_at"),
+                          intake_updated_at=Max("daily_intake__updated_at"))
+                .values_list("year", "days", "intakes", "day_updated_at", "totals_updated_at", "intake_updated_at"))
+        return {row[0]: hashlib.md5(repr(row[1:]).encode()).hexdigest() for row in rows}
+
+
+class PillAdherenceCache:
+    """
+    Cache of pill adherence reports.
+
+    Reports are keyed by their arguments, the current date and a version derived from the count and the latest
+    `updated_at` of pill takings and pills, so any change makes a fresh report and a cached one costs one query.
+    """
+
+    def __init__(self, alias: str, timeout: int | None):
+        self.alias = alias
+        self.timeout = timeout
+
+    @property
+    def cache(self):
+        return caches[self.alias]
+
+    def get(self, period: str = "month", date_from=None, date_to=None, pill_ids=None) -> list:
+        """
+        Adherence of the pills, see `pill_adherence`
+        """
+
+        today = datetime.date.today()
+        arguments = (period, date_from, date_to, sorted(pill_ids) if pill_ids is not None else None, today)
+        key = f"foodlog:pills:adherence:{hashlib.md5(repr((arguments, self._derive_version())).encode()).hexdigest()}"
+        report = self.cache.get(key)
+        if report is None:
+            logger.debug("Pill adherence cache miss for %s", arguments)
+            report = pill_adherence(period, date_from, date_to, pill_ids, today)
+            self.cache.set(key, report, timeout=self.timeout)
+        return report
+
+    @staticmethod
+    def _derive_version() -> tuple:
+        """
+        Version of all pills and their takings, by a single query. Pills are the outer side of the join, so pills
+        without takings, which are listed in the report too, count as well.
+        """
+
+        return tuple(Pill.objects.aggregate(
+            pill_count=Count("id", distinct=True), pill_updated_at=Max("updated_at"),
+            count=Count("takingpill"), updated_at=Max("takingpill__updated_at"),
+            day_updated_at=Max("takingpill__day__updated_at"),
+        ).values())
+
+
+product_cache = ProductCache(
+    maxsize=getattr(settings, "PRODUCT_CACHE_SIZE", 10000),
+    alias=getattr(settings, "PRODUCT_CACHE_ALIAS", "default"),
+    check_interval=getattr(settings, "PRODUCT_CACHE_CHECK_INTERVAL", 1.0),
+    timeout=getattr(settings, "PRODUCT_CACHE_TIMEOUT", 3600),
+)
+
+day_table_cache = DayTableCache(
+    alias=getattr(settings, "DAY_TABLE_CACHE_ALIAS", "default"),
+    timeout=getattr(settings, "DAY_TABLE_CACHE_TIMEOUT", 3600),
+)
+
+default_intake_cache = DefaultIntakeCache(
+    alias=getattr(settings, "DEFAULT_INTAKE_CACHE_ALIAS", "default"),
+    check_interval=getattr(settings, "DEFAULT_INTAKE_CACHE_CHECK_INTERVAL", 1.0),
+)
+
+calendar_cache = CalendarCache(
+    alias=getattr(settings, "CALENDAR_CACHE_ALIAS", "default"),
+    timeout=getattr(settings, "CALENDAR_CACHE_TIMEOUT", 24 * 3600),
+)
+
+pill_adherence_cache = PillAdherenceCache(
+    alias=getattr(settings, "PILL_ADHERENCE_CACHE_ALIAS", "default"),
+    timeout=getattr(settings, "PILL_ADHERENCE_CACHE_TIMEOUT", 24 * 3600),
+)
@@ -0,0 +1,126 @@
+import csv
+import datetime
+import json
+import zlib
+
+from asgiref.sync import sync_to_async
+from django.db.models import Prefetch
+
+from .models import Day, Dish, Meal, Note, TakingPill
+
+EXPORT_FIELDS = ("type", "date", "time", "title", "weight", "energy", "proteins", "fats", "carbs", "sugar", "salt",
+                 "lactose_free", "is_taken", "note")
+
+EXPORT_FORMATS = {
+    "ndjson": ("application/x-ndjson", "ndjson"),
+    "csv": ("text/csv", "csv"),
+}
+
+BUFFER_SIZE = 64 * 1024
+
+
+def journal_rows(date_from: datetime.date | None = None, date_to: datetime.date | None = None,
+                 chunk_size: int = 500):
+    """
+    Flat rows of days, meals, dishes (with computed nutrients), pill takings and notes ordered by date.
+    Days are read in chunks with their related rows prefetched per chunk, so memory does not grow with the range.
+    """
+
+    days = Day.objects.order_by("date")
+    if date_from:
+        days = days.filter(date__gte=date_from)
+    if date_to:
+        days = days.filter(date__lte=date_to)
+    days = days.select_related("daily_intake").with_rollup().prefetch_related(
+        Prefetch("meal_set", queryset=Meal.objects.select_related("title").order_by("time", "id")),
+        Prefetch("meal_set__dish_set", queryset=Dish.objects.select_related("product").order_by("id")),
+        Prefetch("takingpill_set", queryset=TakingPill.objects.select_related("pill").order_by("time", "id")),
+        Prefetch("note_set", queryset=Note.objects.order_by("time", "id")),
+    )
+
+    for day in days.iterator(chunk_size=chunk_size):
+        yield _row("day", day.date, title=day.daily_intake and day.daily_intake.title, weight=day.weight,
+                   energy=day.energy, proteins=day.proteins, fats=day.fats, carbs=day.carbs)
+        for meal in day.meal_set.all():
+            yield _row("meal", day.date, meal.time, title=meal.title.title, weight=meal.weight,
+                       energy=meal.energy, proteins=meal.proteins, fats=meal.fats, carbs=meal.carbs)
+            for dish in meal.dish_set.all():
+                yield _row("dish", day.date, meal.time, title=dish.product.title, weight=dish.weight,
+                           energy=dish.energy, proteins=dish.proteins, fats=dish.fats, carbs=dish.carbs,
+                           sugar=dish.sugar, salt=dish.salt, lactose_free=dish.lactose_free, note=dish.note)
+        for takingpill in day.takingpill_set.all():
+            yield _row("takingpill", day.date, takingpill.time, title=takingpill.pill.title,
+                       is_taken=takingpill.is_taken, note=takingpill.note)
+        for note in day.note_set.all():
+            yield _row("note", day.date, note.time, note=note.note)
+
+
+def _row(row_type: str, date: datetime.date, time: datetime.time | None = None, **values) -> dict:
+    row = dict.fromkeys(EXPORT_FIELDS)
+    row.update(values, type=row_type, date=date.isoformat(), time=time.isoformat() if time else None)
+    return row
+
+
+def ndjson_lines(rows):
+    for row in rows:
+        yield json.dumps(row, ensure_ascii=False) + "\n"
+
+
+class _Echo:
+    """
+    File-like object returning what is written, lets csv.writer produce lines one by one
+    """
+
+    def write(self, value: str) -> str:
+        return value
+
+
+def csv_lines(rows):
+    writer = csv.writer(_Echo())
+    yield writer.writerow(EXPORT_FIELDS)
+    for row in rows:
+        yield writer.writerow(["" if row[field] is None else row[field] for field in EXPORT_FIELDS])
+
+
+def export_journal(date_from: datetime.date | None = None, date_to: datetime.date | None = None,
+                   export_format: str = "ndjson", compress: bool = False, chunk_size: int = 500):
+    """
+    Journal as a stream of byte chunks of about BUFFER_SIZE, gzipped on the fly if `compress`
+    """
+
+    lines = {"ndjson": ndjson_lines, "csv": csv_lines}[export_format](journal_rows(date_from, date_to, chunk_size))
+    compressor = zlib.compressobj(wbits=zlib.MAX_WBITS | 16) if compress else None
+
+    buffer = []
+    size = 0
+    for line in lines:
+        buffer.append(line)
+        size += len(line)
+        if size >= BUFFER_SIZE:
+            chunk = "".join(buffer).encode()
+            buffer, size = [], 0
+            if compressor:
+                chunk = compressor.compress(chunk)
+            if chunk:
+                yield chunk
+
+    chunk = "".join(buffer).encode()
+    if compressor:
+        chunk = compressor.compress(chunk) + compressor.flush()
+    if chunk:
+        yield chunk
+
+
+async def aexport_journal(*args, **kwargs):
+    """
+    `export_journal` as an async iterator for ASGI, which buffers sync iterators whole.
+    Chunks are produced one at a time in the thread of the request, so the database cursor stays in one thread.
+    """
+
+    chunks = export_journal(*args, **kwargs)
+    next_chunk = sync_to_async(next, thread_sensitive=True)
+    try:
+        while (chunk := await next_chunk(chunks, None)) is not None:
+            yield chunk
+    finally:
+        await sync_to_async(chunks.close, thread_sensitive=True)()
@@ -0,0 +1,106 @@
+import datetime
+import json
+import statistics
+import time
+from pathlib import Path
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Count
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+
+from foodlog.models import Day, Dish, Meal, Product
+
+
+class Command(BaseCommand):
+    help = ("Measure latency and query counts of the admin pages with the test client, "
+            "optionally comparing with a previous JSON report")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--iterations", type=int, default=20, help="Measured requests per page")
+        parser.add_argument("--warmup", type=int, default=2, help="Unmeasured requests per page")
+        parser.add_argument("--search", default="chicken", help="Product search term")
+        parser.add_argument("--output", help="Write the JSON report to this file")
+        parser.add_argument("--compare", help="Previous JSON report to compare with")
+
+    def handle(self, *args, **options):
+        if options["iterations"] < 1:
+            raise CommandError("--iterations must be positive")
+
+        # The benchmark user and sessions are rolled back, nothing is left in the database
+        with transaction.atomic():
+            client = Client()
+            client.force_login(User.objects.create_superuser("foodlog-benchmark", password=None))
+            pages = {name: self._measure(client, url, options["iterations"], options["warmup"])
+                     for name, url in self._pages(options["search"]).items()}
+            transaction.set_rollback(True)
+
+        report = {
+            "created_at": datetime.datetime.now().isoformat(timespec="seconds"),
+            "database": connection.vendor,
+            "data": {"days": Day.objects.count(), "meals": Meal.objects.count(), "dishes": Dish.objects.count(),
+                     "products": Product.objects.count()},
+            "iterations": options["iterations"],
+            "pages": pages,
+        }
+        previous = json.loads(Path(options["compare"]).read_text())["pages"] if options["compare"] else {}
+
+        self.stdout.write(f"{'Page':<20}{'p50 ms':>10}{'p95 ms':>10}{'Queries':>9}")
+        for name, result in pages.items():
+            line = f"{name:<20}{result['p50_ms']:>10.1f}{result['p95_ms']:>10.1f}{result['queries']:>9}"
+            if name in previous:
+                line += (f"   p50 {result['p50_ms'] - previous[name]['p50_ms']:+.1f} ms,"
+                         f" queries {result['queries'] - previous[name]['queries']:+d}")
+            self.stdout.write(line)
+
+        if options["output"]:
+            Path(options["output"]).write_text(json.dumps(report, indent=2))
+            self.stdout.write(self.style.SUCCESS(f"Report written to {options['output']}"))
+
+    @staticmethod
+    def _pages(search: str) -> dict:
+        """
+        Admin URLs to measure, the day and the meal are the ones with most dishes
+        """
+
+        day = Day.objects.annotate(dishes=Count("meal__dish")).order_by("-dishes", "-date").first()
+        meal = Meal.objects.annotate(dishes=Count("dish")).order_by("-dishes", "-id").first()
+        if day is None or meal is None:
+            raise CommandError("There are no days with meals, run generate_journal first")
+
+        return {
+            "day_changelist": "/admin/foodlog/day/",
+            "day_change": f"/admin/foodlog/day/{day.pk}/change/",
+            "meal_changelist": "/admin/foodlog/meal/",
+            "meal_change": f"/admin/foodlog/meal/{meal.pk}/change/",
+            "dish_changelist": "/admin/foodlog/dish/",
+            "product_search": f"/admin/foodlog/product/?q={search}",
+            "product_autocomplete": (f"/admin/autocomplete/?app_label=foodlog&model_name=dish&field_name=product"
+                                     f"&term={search}"),
+        }
+
+    @staticmethod
+    def _measure(client: Client, url: str, iterations: int, warmup: int) -> dict:
+        for _ in range(warmup):
+            client.get(url)
+
+        durations, queries = [], []
+        for _ in range(iterations):
+            with CaptureQueriesContext(connection) as context:
+                started = time.perf_counter()
+                response = client.get(url)
+                durations.append((time.perf_counter() - started) * 1000)
+            if response.status_code != 200:
+                raise CommandError(f"{url} returned {response.status_code}")
+            queries.append(len(context.captured_queries))
+
+        quantiles = statistics.quantiles(durations, n=20, method="inclusive") if iterations > 1 else durations * 19
+        return {
+            "url": url,
+            "p50_ms": round(statistics.median(durations), 2),
+            "p95_ms": round(quantiles[18], 2),
+            "max_ms": round(max(durations), 2),
+            "queries": max(queries),
+        }
@@ -0,0 +1,149 @@
+import datetime
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from foodlog.models import Day, Dish, Meal, MealTitle, Note, Pill, Product, TakingPill
+
+# Composite indexes and the foreign keys they start with, which have no indexes of their own
+JOURNAL_INDEXES = {
+    "meal_day_time_id_idx": (Meal, "day"),
+    "dish_meal_id_idx": (Dish, "meal"),
+    "takingpill_day_time_id_idx": (TakingPill, "day"),
+    "note_day_time_id_idx": (Note, "day"),
+}
+
+
+class Command(BaseCommand):
+    help = ("Compare query plans of the journal access paths with the composite indexes and with plain foreign key "
+            "indexes instead, on a synthetic dataset, PostgreSQL only. All changes are rolled back, but the journal "
+            "tables are locked until then: run it on a dedicated database with --drop-indexes.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--days", type=int, default=3650, help="Synthetic days to add")
+        parser.add_argument("--meals-per-day", type=int, default=5, help="Synthetic meals per day")
+        parser.add_argument("--dishes-per-meal", type=int, default=4, help="Synthetic dishes per meal")
+        parser.add_argument("--json", action="store_true", help="Print results as JSON")
+        parser.add_argument("--drop-indexes", action="store_true",
+                            help="Confirm the journal indexes may be dropped in the rolled back transaction")
+
+    def handle(self, *args, **options):
+        if connection.vendor != "postgresql":
+            raise CommandError("Query plans can be compared on PostgreSQL only")
+        if not options["drop_indexes"]:
+            raise CommandError(f"The benchmark drops indexes of {connection.settings_dict['NAME']!r} and locks its "
+                               f"journal tables until it finishes, pass --drop-indexes on a dedicated database")
+
+        with transaction.atomic():
+            day = self._generate(options["days"], options["meals_per_day"], options["dishes_per_meal"])
+            results = [self._compare(title, queryset) for title, queryset in self._queries(day)]
+            transaction.set_rollback(True)
+
+        if options["json"]:
+            self.stdout.write(json.dumps(results, indent=2))
+            return
+
+        for result in results:
+            self.stdout.write(self.style.MIGRATE_HEADING(result["query"]))
+            for variant in ("with_indexes", "fk_indexes"):
+                plan = result[variant]
+                self.stdout.write(f"  {variant:<16} {plan['time_ms']:>8.3f} ms  {plan['plan']}")
+
+    @staticmethod
+    def _queries(day: Day) -> list:
+        meal_ids = list(day.meal_set.values_list("id", flat=True))
+        return [
+            ("Meals of the day", Meal.objects.filter(day=day).order_by("time", "id")),
+            ("Dishes of the meal", Dish.objects.filter(meal_id=meal_ids[0]).order_by("id")),
+            ("Dishes of the day's meals", Dish.objects.filter(meal_id__in=meal_ids).order_by("meal", "id")),
+            ("Pill takings of the day", TakingPill.objects.filter(day=day).order_by("time", "id")),
+            ("Notes of the day", Note.objects.filter(day=day).order_by("time", "id")),
+            ("TakingPillAdmin changelist", TakingPill.objects.order_by("-day", "-time", "pill")[:100]),
+            ("NoteAdmin changelist", Note.objects.order_by("-day", "-time")[:100]),
+            ("DayAdmin changelist", Day.objects.order_by("-date")[:10]),
+        ]
+
+    def _compare(self, title: str, queryset) -> dict:
+        """
+        Plans of the query with the journal indexes and with foreign key indexes instead in a rolled back savepoint
+        """
+
+        result = {"query": title, "with_indexes": self._explain(queryset)}
+        with transaction.atomic():
+            with connection.cursor() as cursor:
+                for index, (model, field) in JOURNAL_INDEXES.items():
+                    cursor.execute(f'DROP INDEX IF EXISTS "{index}"')
+                    cursor.execute(f'CREATE INDEX "benchmark_{index}" ON "{model._meta.db_table}" '
+                                   f'("{model._meta.get_field(field).column}")')
+            result["fk_indexes"] = self._explain(queryset)
+            transaction.set_rollback(True)
+        return result
+
+    @staticmethod
+    def _explain(queryset) -> dict:
+        sql, params = queryset.query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute(f"EXPLAIN (ANALYZE, FORMAT JSON) {sql}", params)
+            explained = cursor.fetchone()[0]
+        if isinstance(explained, str):
+            explained = json.loads(explained)
+
+        def describe(node: dict) -> str:
+            name = node["Node Type"]
+            if node.get("Scan Direction") == "Backward":
+                name += " Backward"
+            if node.get("Index Name"):
+                name += f" ({node['Index Name']})"
+            children = [describe(child) for child in node.get("Plans", [])]
+            return f"{name} > {', '.join(children)}" if children else name
+
+        return {"plan": describe(explained[0]["Plan"]), "time_ms": explained[0]["Execution Time"]}
+
+    @staticmethod
+    def _generate(days: int, meals_per_day: int, dishes_per_meal: int) -> Day:
+        """
+        Insert synthetic journal before the first real day with set-based SQL, returns a day in the middle
+        """
+
+        first = Day.objects.order_by("date").values_list("date", flat=True).first() or datetime.date.today()
+        start = first - datetime.timedelta(days=days)
+        title = MealTitle.objects.create(title="Benchmark meal")
+        product = Product.objects.create(title="Benchmark product", energy=100, proteins=10, fats=5, carbs=10)
+        pill = Pill.objects.create(title="Benchmark pill")
+
+        tables = {model.__name__: model._meta.db_table for model in (Day, Meal, Dish, TakingPill, Note)}
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"INSERT INTO {tables['Day']} (date, created_at, updated_at) "
+                f"SELECT %s::date + g, now(), now() FROM generate_series(0, %s - 1) g",
+                [start, days],
+            )
+            cursor.execute(
+                f"INSERT INTO {tables['Meal']} (title_id, day_id, time, created_at, updated_at) "
+                f"SELECT %s, d.id, time '07:00' + m * interval '3 hours', now(), now() "
+                f"FROM {tables['Day']} d CROSS JOIN generate_series(0, %s - 1) m WHERE d.date < %s",
+                [title.pk, meals_per_day, first],
+            )
+            cursor.execute(
+                f"INSERT INTO {tables['Dish']} (product_id, meal_id, weight, energy, proteins, fats, carbs, "
+                f"created_at, updated_at) "
+                f"SELECT %s, m.id, 100, 100, 10, 5, 10, now(), now() FROM {tables['Meal']} m "
+                f"JOIN {tables['Day']} d ON d.id = m.day_id CROSS JOIN generate_series(1, %s) "
+                f"WHERE d.date < %s",
+                [product.pk, dishes_per_meal, first],
+            )
+            for table, extra_columns, extra_values in ((tables["TakingPill"], "pill_id, is_taken", "%s, true"),
+                                                       (tables["Note"], "note", "%s")):
+                cursor.execute(
+                    f"INSERT INTO {table} (day_id, time, {extra_columns}, created_at, updated_at) "
+                    f"SELECT d.id, time '09:00' + n * interval '6 hours', {extra_values}, now(), now() "
+                    f"FROM {tables['Day']} d CROSS JOIN generate_series(0, 1) n WHERE d.date < %s",
+                    [pill.pk if table == tables["TakingPill"] else "Benchmark note", first],
+                )
+            # Check the deferred foreign keys now, indexes can't be created on tables with pending checks
+            cursor.execute("SET CONSTRAINTS ALL IMMEDIATE")
+            for table in tables.values():
+                cursor.execute(f"ANALYZE {table}")
+
+        return Day.objects.get(date=start + datetime.timedelta(days=days // 2))
@@ -0,0 +1,114 @@
+import json
+import os
+import signal
+import statistics
+import subprocess
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+MODES = ("runserver", "wsgi", "asgi")
+
+
+class Command(BaseCommand):
+    help = "Compare startup time and request throughput of runserver and the production servers"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--modes", default=",".join(MODES), help="Comma separated FOODLOG_SERVER values")
+        parser.add_argument("--path", default="/admin/login/", help="Path to request")
+        parser.add_argument("--requests", type=int, default=500, help="Requests per mode")
+        parser.add_argument("--concurrency", type=int, default=8, help="Concurrent clients")
+        parser.add_argument("--port", type=int, default=8765, help="Port to bind the servers to")
+        parser.add_argument("--startup-timeout", type=float, default=60, help="Seconds to wait for a server")
+        parser.add_argument("--json", action="store_true", help="Print results as JSON")
+
+    def handle(self, *args, **options):
+        modes = [mode.strip() for mode in options["modes"].split(",") if mode.strip()]
+        unknown = set(modes) - set(MODES)
+        if unknown:
+            raise CommandError(f"Unknown modes: {', '.join(sorted(unknown))}")
+
+        results = [self._benchmark(mode, options) for mode in modes]
+
+        if options["json"]:
+            self.stdout.write(json.dumps(results, indent=2))
+            return
+
+        self.stdout.write(f"{'mode':<10} {'startup, s':>10} {'req/s':>9} {'p50, ms':>8} {'p95, ms':>8} {'errors':>7}")
+        for result in results:
+            self.stdout.write(
+                f"{result['mode']:<10} {result['startup_s']:>10.2f} {result['rps']:>9.1f} "
+                f"{result['p50_ms']:>8.1f} {result['p95_ms']:>8.1f} {result['errors']:>7}"
+            )
+
+    def _benchmark(self, mode: str, options: dict) -> dict:
+        """
+        Start the server in the given mode, wait until it answers and load it
+        """
+
+        url = f"http://127.0.0.1:{options['port']}{options['path']}"
+        env = {**os.environ, "FOODLOG_SERVER": mode, "FOODLOG_BIND": f"127.0.0.1:{options['port']}",
+               "FOODLOG_ACCESS_LOG": ""}
+        started = time.monotonic()
+        process = subprocess.Popen(["sh", str(settings.BASE_DIR / "entrypoint.sh")], cwd=settings.BASE_DIR, env=env,
+                                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, start_new_session=True)
+        try:
+            startup = self._wait_ready(url, started, options["startup_timeout"])
+            latencies, errors, elapsed = self._load(url, options["requests"], options["concurrency"])
+        finally:
+            os.killpg(process.pid, signal.SIGTERM)
+            process.wait(timeout=30)
+
+        latencies.sort()
+        return {
+            "mode": mode,
+            "startup_s": startup,
+            "requests": options["requests"],
+            "concurrency": options["concurrency"],
+            "rps": len(latencies) / elapsed if elapsed else 0.0,
+            "p50_ms": statistics.median(latencies) * 1000 if latencies else 0.0,
+            "p95_ms": latencies[int(len(latencies) * 0.95) - 1] * 1000 if latencies else 0.0,
+            "errors": errors,
+        }
+
+    @staticmethod
+    def _wait_ready(url: str, started: float, timeout: float) -> float:
+        """
+        Seconds from start until the first successful response
+        """
+
+        while time.monotonic() - started < timeout:
+            try:
+                with urllib.request.urlopen(url, timeout=1) as response:
+                    response.read()
+                return time.monotonic() - started
+            except (urllib.error.URLError, ConnectionError, TimeoutError):
+                time.sleep(0.05)
+        raise CommandError(f"Server did not answer {url} in {timeout}s")
+
+    @staticmethod
+    def _load(url: str, requests: int, concurrency: int) -> tuple:
+        """
+        Latencies of successful requests, error count and total time
+        """
+
+        def fetch(_):
+            request_started = time.monotonic()
+            try:
+                with urllib.request.urlopen(url, timeout=30) as response:
+                    response.read()
+            except (urllib.error.URLError, ConnectionError, TimeoutError):
+                return None
+            return time.monotonic() - request_started
+
+        started = time.monotonic()
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            results = list(executor.map(fetch, range(requests)))
+        elapsed = time.monotonic() - started
+
+        latencies = [latency for latency in results if latency is not None]
+        return latencies, requests - len(latencies), elapsed
@@ -0,0 +1,33 @@
+import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from foodlog.models import Day
+from foodlog.services import copy_day
+
+
+class Command(BaseCommand):
+    help = "Copy meals, dishes and pill takings from one day to another, creating the target day if needed"
+
+    def add_arguments(self, parser):
+        parser.add_argument("src", type=datetime.date.fromisoformat, help="Source date, YYYY-MM-DD")
+        parser.add_argument("dst", type=datetime.date.fromisoformat, help="Target date, YYYY-MM-DD")
+        parser.add_argument("--append", action="store_true", help="Allow copying into a day that is not empty")
+
+    def handle(self, *args, **options):
+        source = Day.objects.filter(date=options["src"]).first()
+        if source is None:
+            raise CommandError(f"Day {options['src']} does not exist")
+
+        with transaction.atomic():
+            target, created = Day.objects.get_or_create(
+                date=options["dst"], defaults={"daily_intake": source.daily_intake}
+            )
+            if not created and not options["append"] and (
+                target.meal_set.exists() or target.takingpill_set.exists()
+            ):
+                raise CommandError(f"Day {target} is not empty, use --append to copy anyway")
+            copy_day(source, target)
+
+        self.stdout.write(self.style.SUCCESS(f"Copied {source} to {target}"))
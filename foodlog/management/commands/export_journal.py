@@ -0,0 +1,30 @@
+import datetime
+import sys
+
+from django.core.management.base import BaseCommand
+
+from foodlog.export import EXPORT_FORMATS, export_journal
+
+
+class Command(BaseCommand):
+    help = "Export days, meals, dishes with nutrients, pill takings and notes as NDJSON or CSV"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--from", dest="date_from", type=datetime.date.fromisoformat, help="First date")
+        parser.add_argument("--to", dest="date_to", type=datetime.date.fromisoformat, help="Last date")
+        parser.add_argument("--format", choices=sorted(EXPORT_FORMATS), default="ndjson", help="Output format")
+        parser.add_argument("--gzip", action="store_true", help="Compress the output")
+        parser.add_argument("--chunk-size", type=int, default=500, help="Days read per query")
+        parser.add_argument("--output", "-o", help="Output file, stdout by default")
+
+    def handle(self, *args, **options):
+        chunks = export_journal(options["date_from"], options["date_to"], options["format"], options["gzip"],
+                                options["chunk_size"])
+        if options["output"]:
+            with open(options["output"], "wb") as output:
+                for chunk in chunks:
+                    output.write(chunk)
+        else:
+            for chunk in chunks:
+                sys.stdout.buffer.write(chunk)
+            sys.stdout.buffer.flush()
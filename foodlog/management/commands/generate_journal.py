@@ -0,0 +1,113 @@
+import datetime
+import random
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from foodlog.models import DailyIntake, Day, DayTotals, Dish, Meal, MealTitle, Note, Pill, Product, TakingPill
+from foodlog.services import BULK_BATCH_SIZE, products_changed
+from foodlog.similar import product_index
+
+# Title, energy, proteins, fats, carbs per 100 g
+FOODS = (
+    ("Oatmeal", 68, 2.4, 1.4, 12), ("Buckwheat", 92, 3.4, 0.6, 20), ("Rice", 130, 2.7, 0.3, 28),
+    ("Pasta", 158, 5.8, 0.9, 31), ("Bread", 265, 9, 3.2, 49), ("Chicken breast", 165, 31, 3.6, 0),
+    ("Beef", 250, 26, 15, 0), ("Salmon", 208, 20, 13, 0), ("Egg", 155, 13, 11, 1.1),
+    ("Cottage cheese", 98, 11, 4.3, 3.4), ("Greek yogurt", 59, 10, 0.4, 3.6), ("Milk", 42, 3.4, 1, 5),
+    ("Cheese", 402, 25, 33, 1.3), ("Apple", 52, 0.3, 0.2, 14), ("Banana", 89, 1.1, 0.3, 23),
+    ("Tomato", 18, 0.9, 0.2, 3.9), ("Cucumber", 15, 0.7, 0.1, 3.6), ("Potato", 77, 2, 0.1, 17),
+    ("Olive oil", 884, 0, 100, 0), ("Walnuts", 654, 15, 65, 14), ("Chocolate", 546, 4.9, 31, 61),
+    ("Lentils", 116, 9, 0.4, 20), ("Tofu", 76, 8, 4.8, 1.9), ("Avocado", 160, 2, 15, 9),
+)
+VARIANTS = ("", "organic", "light", "homemade", "store", "frozen", "fresh", "smoked", "roasted", "whole grain")
+MEALS = (("Breakfast", 8), ("Second breakfast", 11), ("Lunch", 13), ("Snack", 16), ("Dinner", 19),
+         ("Late snack", 21))
+PILLS = ("Vitamin D", "Omega-3", "Magnesium", "Iron")
+NOTES = ("Felt great", "Training day", "Slept badly", "Ate out", "Headache in the evening", "Rest day")
+
+
+class Command(BaseCommand):
+    help = "Bulk generate a synthetic journal: products, days, meals, dishes, pill takings and notes"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--years", type=int, default=1, help="Years of days to generate, ending today")
+        parser.add_argument("--meals-per-day", type=int, default=4, help="Meals per day")
+        parser.add_argument("--dishes-per-meal", type=int, default=3, help="Average dishes per meal")
+        parser.add_argument("--products", type=int, default=500, help="Products to generate")
+        parser.add_argument("--seed", type=int, default=0, help="Random seed, the same seed gives the same journal")
+
+    def handle(self, *args, **options):
+        if options["years"] < 1 or options["products"] < 1 or options["dishes_per_meal"] < 1:
+            raise CommandError("--years, --products and --dishes-per-meal must be positive")
+        if not 1 <= options["meals_per_day"] <= len(MEALS):
+            raise CommandError(f"--meals-per-day must be between 1 and {len(MEALS)}")
+
+        rnd = random.Random(options["seed"])
+        started = time.monotonic()
+        with transaction.atomic():
+            products = self._products(rnd, options["products"])
+            # Bulk inserts bypass the signals, the similarity index loads the new products once committed
+            products_changed([product.pk for product in products])
+            transaction.on_commit(product_index.update)
+            titles = [MealTitle.objects.get_or_create(title=title)[0] for title, _ in MEALS]
+            pills = [Pill.objects.get_or_create(title=title)[0] for title in PILLS]
+            intake = DailyIntake.objects.filter(default=True).first() or DailyIntake.objects.create(
+                title="Generated", default=True, energy=2200, proteins=110, fats=75, carbs=260
+            )
+
+            today = datetime.date.today()
+            dates = [today - datetime.timedelta(days=n) for n in range(options["years"] * 365)]
+            existing = set(Day.objects.filter(date__in=dates).values_list("date", flat=True))
+            days = Day.objects.bulk_create([Day(date=date, daily_intake=intake) for date in dates
+                                            if date not in existing], batch_size=BULK_BATCH_SIZE)
+
+            meals = Meal.objects.bulk_create([
+                Meal(day=day, title=title, time=datetime.time(hour, rnd.randrange(60)))
+                for day in days
+                for title, (_, hour) in sorted(rnd.sample(list(zip(titles, MEALS)), options["meals_per_day"]),
+                                               key=lambda item: item[1][1])
+            ], batch_size=BULK_BATCH_SIZE)
+            dishes = Dish.objects.bulk_create([
+                Dish(meal=meal, product=rnd.choice(products), weight=rnd.randrange(20, 350, 5)).snapshot()
+                for meal in meals
+                for _ in range(max(1, round(rnd.gauss(options["dishes_per_meal"], 1))))
+            ], batch_size=BULK_BATCH_SIZE)
+            takingpills = TakingPill.objects.bulk_create([
+                TakingPill(day=day, pill=pill, time=datetime.time(9 + 11 * n), is_taken=rnd.random() < 0.9)
+                for day in days
+                for n, pill in enumerate(pills[:2])
+            ], batch_size=BULK_BATCH_SIZE)
+            notes = Note.objects.bulk_create([
+                Note(day=day, time=datetime.time(22), note=rnd.choice(NOTES))
+                for day in days if rnd.random() < 0.2
+            ], batch_size=BULK_BATCH_SIZE)
+
+            day_ids = [day.pk for day in days]
+            for start in range(0, len(day_ids), BULK_BATCH_SIZE):
+                DayTotals.refresh(day_ids[start:start + BULK_BATCH_SIZE])
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Generated {len(days)} days, {len(meals)} meals, {len(dishes)} dishes, {len(takingpills)} pill takings, "
+            f"{len(notes)} notes and {len(products)} products in {time.monotonic() - started:.1f}s"
+        ))
+
+    @staticmethod
+    def _products(rnd: random.Random, count: int) -> list:
+        """
+        Products with nutrients varied around real foods, existing ones with the same titles are reused
+        """
+
+        products = {}
+        for n in range(count):
+            food, energy, proteins, fats, carbs = FOODS[n % len(FOODS)]
+            variant = VARIANTS[n // len(FOODS) % len(VARIANTS)]
+            title = " ".join(filter(None, [food, variant, str(n // (len(FOODS) * len(VARIANTS)) or "")]))
+            factor = rnd.uniform(0.85, 1.15)
+            products[title] = Product(
+                title=title, energy=round(energy * factor, 1), proteins=round(proteins * factor, 1),
+                fats=round(fats * factor, 1), carbs=round(carbs * factor, 1), sugar=round(carbs * rnd.random() / 2, 1),
+                salt=round(rnd.random(), 2), lactose_free=rnd.choice([True, False, None]),
+            )
+        Product.objects.bulk_create(products.values(), batch_size=BULK_BATCH_SIZE, ignore_conflicts=True)
+        return list(Product.objects.filter(title__in=products))
@@ -0,0 +1,206 @@
+import csv
+import json
+import math
+import sys
+import time
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from foodlog.caches import PRODUCT_NUTRIENTS
+from foodlog.models import Product
+from foodlog.services import products_changed
+from foodlog.similar import product_index
+
+REQUIRED_FLOATS = ("energy", "proteins", "fats", "carbs")
+OPTIONAL_FLOATS = ("sugar", "salt")
+# Updated only if the input has the column (or the key, for JSON), other values of existing products are kept
+OPTIONAL_FIELDS = OPTIONAL_FLOATS + ("note", "rate", "lactose_free")
+BOOLEANS = {"1": True, "true": True, "yes": True, "0": False, "false": False, "no": False}
+
+
+def _iter_csv(file):
+    yield from csv.DictReader(file)
+
+
+class MalformedRow:
+    """
+    Row that can't be decoded, rejected like an invalid one
+    """
+
+    def __init__(self, error: str):
+        self.error = error
+
+
+def _iter_ndjson(file):
+    for line in file:
+        if line.strip():
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError as err:
+                yield MalformedRow(f"malformed JSON: {err}")
+
+
+def _iter_json(file, read_size: int = 64 * 1024):
+    """
+    Elements of a top-level JSON array, decoded one by one without loading the whole file
+    """
+
+    decoder = json.JSONDecoder()
+    buffer = file.read(read_size).lstrip()
+    if not buffer.startswith("["):
+        raise ValueError("JSON file must contain an array of products")
+    buffer = buffer[1:]
+    while True:
+        buffer = buffer.lstrip().lstrip(",").lstrip()
+        if buffer.startswith("]"):
+            return
+        try:
+            item, end = decoder.raw_decode(buffer)
+        except json.JSONDecodeError:
+            chunk = file.read(read_size)
+            if not chunk:
+                raise
+            buffer += chunk
+            continue
+        yield item
+        buffer = buffer[end:]
+
+
+READERS = {"csv": _iter_csv, "ndjson": _iter_ndjson, "json": _iter_json}
+
+
+def _float(row: dict, field: str, required: bool) -> float | None:
+    value = row.get(field)
+    if value is None or str(value).strip() == "":
+        if required:
+            raise ValueError(f"{field} is required")
+        return None
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"{field} is not a number: {value!r}")
+    if not math.isfinite(value) or value < 0:
+        raise ValueError(f"{field} must be a non-negative number: {value!r}")
+    return value
+
+
+def clean_row(row: dict) -> dict:
+    """
+    Product fields from a raw row, optional ones only if the row has them, ValueError if the row is not valid
+    """
+
+    if isinstance(row, MalformedRow):
+        raise ValueError(row.error)
+    if not isinstance(row, dict):
+        raise ValueError(f"row is not an object: {row!r:.50}")
+    title = str(row.get("title") or "").strip()
+    if not title:
+        raise ValueError("title is required")
+    if len(title) > 150:
+        raise ValueError("title is longer than 150 characters")
+
+    note = str(row.get("note") or "").strip() or None
+    if note and len(note) > 150:
+        raise ValueError("note is longer than 150 characters")
+
+    rate = row.get("rate")
+    if rate is None or str(rate).strip() == "":
+        rate = None
+    else:
+        try:
+            rate = int(rate)
+        except (TypeError, ValueError):
+            raise ValueError(f"rate is not an integer: {rate!r}")
+
+    lactose_free = row.get("lactose_free")
+    if not isinstance(lactose_free, bool) and lactose_free is not None:
+        text = str(lactose_free).strip().lower()
+        if text and text not in BOOLEANS:
+            raise ValueError(f"lactose_free is not a boolean: {lactose_free!r}")
+        lactose_free = BOOLEANS.get(text)
+
+    cleaned = {"title": title, "note": note, "rate": rate, "lactose_free": lactose_free}
+    cleaned.update({field: _float(row, field, True) for field in REQUIRED_FLOATS})
+    cleaned.update({field: _float(row, field, False) for field in OPTIONAL_FLOATS})
+    return {field: value for field, value in cleaned.items() if field not in OPTIONAL_FIELDS or field in row}
+
+
+class Command(BaseCommand):
+    help = "Import products from a CSV, NDJSON or JSON file, inserting new and updating existing ones by title"
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="File to import, '-' for stdin")
+        parser.add_argument("--format", choices=sorted(READERS), help="File format, by extension if not set")
+        parser.add_argument("--batch-size", type=int, default=1000, help="Products upserted per transaction")
+        parser.add_argument("--dry-run", action="store_true", help="Only validate the rows")
+
+    def handle(self, *args, **options):
+        path = options["path"]
+        file_format = options["format"] or Path(path).suffix.lstrip(".").lower()
+        if file_format not in READERS:
+            raise CommandError("Unknown file format, use --format")
+        if options["batch_size"] < 1:
+            raise CommandError("--batch-size must be positive")
+
+        started = time.monotonic()
+        stats = {"rows": 0, "created": 0, "updated": 0, "rejected": 0}
+        batch = {}
+        with (sys.stdin if path == "-" else open(path, encoding="utf-8", newline="")) as file:
+            try:
+                for number, row in enumerate(READERS[file_format](file), start=1):
+                    stats["rows"] += 1
+                    try:
+                        cleaned = clean_row(row)
+                    except ValueError as err:
+                        stats["rejected"] += 1
+                        self.stderr.write(f"Row {number} rejected: {err}")
+                        continue
+                    batch[cleaned["title"]] = cleaned
+                    if len(batch) >= options["batch_size"]:
+                        self._upsert(batch, stats, options["dry_run"])
+                        batch = {}
+            except (ValueError, csv.Error) as err:
+                raise CommandError(f"Can't read {path}: {err}")
+        self._upsert(batch, stats, options["dry_run"])
+
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"{stats['rows']} rows in {elapsed:.2f}s ({stats['rows'] / elapsed if elapsed else 0:.0f} rows/s): "
+            f"{stats['created']} created, {stats['updated']} updated, {stats['rejected']} rejected"
+        ))
+
+    @staticmethod
+    def _upsert(batch: dict, stats: dict, dry_run: bool) -> None:
+        """
+        Insert or update the batch of products by title in one transaction, one statement per set of fields
+        """
+
+        if not batch:
+            return
+
+        existing = {product["title"]: product
+                    for product in Product.objects.filter(title__in=batch).values("id", "title", *PRODUCT_NUTRIENTS)}
+        stats["created"] += len(batch) - len(existing)
+        stats["updated"] += len(existing)
+        if dry_run:
+            return
+
+        changed = [product["id"] for title, product in existing.items()
+                   if any(product[field] != batch[title][field]
+                          for field in PRODUCT_NUTRIENTS if field in batch[title])]
+        by_fields = {}
+        for values in batch.values():
+            by_fields.setdefault(tuple(values), []).append(Product(**values))
+        with transaction.atomic():
+            for fields, products in by_fields.items():
+                Product.objects.bulk_create(
+                    products,
+                    update_conflicts=True,
+                    unique_fields=["title"],
+                    update_fields=[*(field for field in fields if field != "title"), "updated_at"],
+                )
+            products_changed(changed)
+            # New products aren't in `changed`, the index is rebuilt for all products
+            transaction.on_commit(product_index.update)
@@ -0,0 +1,45 @@
+import datetime
+import json
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from foodlog.models import TOTAL_PARAMS
+from foodlog.stats import PERIODS, nutrition_stats
+
+
+class Command(BaseCommand):
+    help = "Average daily energy and macros per week, month or year with adherence to the daily intake"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--period", choices=list(PERIODS), default="month", help="Grouping period")
+        parser.add_argument("--from", dest="date_from", type=datetime.date.fromisoformat, help="First day, YYYY-MM-DD")
+        parser.add_argument("--to", dest="date_to", type=datetime.date.fromisoformat, help="Last day, YYYY-MM-DD")
+        parser.add_argument("--window", type=int, default=3, help="Periods in moving averages")
+        parser.add_argument("--json", action="store_true", help="Print rows as JSON")
+
+    def handle(self, *args, **options):
+        if options["window"] < 1:
+            raise CommandError("--window must be positive")
+
+        started = time.monotonic()
+        rows = nutrition_stats(options["period"], options["date_from"], options["date_to"], options["window"])
+        elapsed = time.monotonic() - started
+
+        if options["json"]:
+            self.stdout.write(json.dumps(rows, default=str, indent=2))
+            return
+
+        self.stdout.write(f"{'Period':<12}{'Days':>6}" + "".join(f"{param.capitalize():>18}" for param in TOTAL_PARAMS)
+                          + f"{'Target':>8}{'On':>5}{'Over':>5}{'Under':>6}{'Adherence':>10}")
+        for row in rows:
+            values = "".join(f"{row[param]:>9.1f} ({_format(row[f'{param}_moving'])})" for param in TOTAL_PARAMS)
+            adherence = "-" if row["adherence"] is None else f"{row['adherence']:.0%}"
+            self.stdout.write(f"{row['period'].isoformat():<12}{row['days']:>6}{values}"
+                              f"{_format(row['energy_target'], 8, 0)}{row['on_target_days']:>5}{row['over_days']:>5}"
+                              f"{row['under_days']:>6}{adherence:>10}")
+        self.stdout.write(self.style.SUCCESS(f"{len(rows)} periods in {elapsed * 1000:.0f} ms"))
+
+
+def _format(value, width: int = 6, digits: int = 1) -> str:
+    return f"{'-':>{width}}" if value is None else f"{value:>{width}.{digits}f}"
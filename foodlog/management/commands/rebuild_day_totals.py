@@ -0,0 +1,55 @@
+import math
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from foodlog.models import Day, DayTotals
+
+
+class Command(BaseCommand):
+    help = "Rebuild the DayTotals rollup from dishes in bulk, or verify it"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=500, help="Days per batch")
+        parser.add_argument("--verify", action="store_true", help="Only compare the rollup with dishes, no writes")
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+        if batch_size < 1:
+            raise CommandError("--batch-size must be positive")
+
+        day_ids = list(Day.objects.order_by("id").values_list("id", flat=True))
+        started = time.monotonic()
+        mismatches = 0
+        for start in range(0, len(day_ids), batch_size):
+            batch = day_ids[start:start + batch_size]
+            if options["verify"]:
+                mismatches += self._verify(batch)
+            else:
+                with transaction.atomic():
+                    DayTotals.refresh(batch)
+
+        elapsed = time.monotonic() - started
+        if not options["verify"]:
+            self.stdout.write(self.style.SUCCESS(f"Rebuilt totals of {len(day_ids)} days in {elapsed:.2f}s"))
+        elif mismatches:
+            raise CommandError(f"{mismatches} of {len(day_ids)} days have wrong totals, run without --verify")
+        else:
+            self.stdout.write(self.style.SUCCESS(f"Totals of {len(day_ids)} days are correct ({elapsed:.2f}s)"))
+
+    def _verify(self, day_ids: list) -> int:
+        """
+        Number of days in the batch whose stored totals differ from computed ones
+        """
+
+        stored = {totals.day_id: totals for totals in DayTotals.objects.filter(day_id__in=day_ids)}
+        mismatches = 0
+        for day_id, values in DayTotals.compute(day_ids).items():
+            totals = stored.get(day_id)
+            wrong = [field for field in DayTotals.FIELDS
+                     if totals is None or not math.isclose(getattr(totals, field), values[field], abs_tol=1e-6)]
+            if wrong:
+                mismatches += 1
+                self.stderr.write(f"Day {day_id}: {'missing' if totals is None else ', '.join(wrong)}")
+        return mismatches
@@ -0,0 +1,64 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+
+from foodlog.caches import day_table_cache
+from foodlog.models import DayTotals, Dish, Product
+from foodlog.services import BULK_BATCH_SIZE
+
+
+class Command(BaseCommand):
+    help = ("Recompute nutrient snapshots of dishes from the current values of their products, "
+            "e.g. after fixing a product. Dishes keep old values otherwise.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--product", type=int, action="append", dest="product_ids", metavar="ID",
+                            help="Product id, may be repeated")
+        parser.add_argument("--all", action="store_true", help="Resnapshot dishes of all products")
+        parser.add_argument("--batch-size", type=int, default=BULK_BATCH_SIZE, help="Dishes per update")
+
+    def handle(self, *args, **options):
+        product_ids = options["product_ids"]
+        if not product_ids and not options["all"]:
+            raise CommandError("Pass --product ID or --all")
+        if options["batch_size"] < 1:
+            raise CommandError("--batch-size must be positive")
+
+        dishes = Dish.objects.select_related("product", "meal").order_by("id")
+        if product_ids:
+            missing = set(product_ids) - set(Product.objects.filter(id__in=product_ids).values_list("id", flat=True))
+            if missing:
+                raise CommandError(f"No products with ids {', '.join(map(str, sorted(missing)))}")
+            dishes = dishes.filter(product_id__in=product_ids)
+
+        started = time.monotonic()
+        changed, day_ids = 0, set()
+        with transaction.atomic():
+            batch = []
+            for dish in dishes.iterator(chunk_size=options["batch_size"]):
+                before = [getattr(dish, field) for field in Dish.SNAPSHOT_FIELDS]
+                if before != [getattr(dish.snapshot(), field) for field in Dish.SNAPSHOT_FIELDS]:
+                    batch.append(dish)
+                if len(batch) >= options["batch_size"]:
+                    changed += self._update(batch, day_ids)
+                    batch = []
+            changed += self._update(batch, day_ids)
+
+            DayTotals.refresh(day_ids)
+            day_table_cache.invalidate(day_ids)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Updated {changed} dishes of {len(day_ids)} days in {time.monotonic() - started:.2f}s"
+        ))
+
+    @staticmethod
+    def _update(dishes: list, day_ids: set) -> int:
+        # bulk_update() skips auto_now, day table versions are derived from updated_at
+        now = timezone.now()
+        for dish in dishes:
+            dish.updated_at = now
+        Dish.objects.bulk_update(dishes, [*Dish.SNAPSHOT_FIELDS, "updated_at"])
+        day_ids.update(dish.meal.day_id for dish in dishes)
+        return len(dishes)
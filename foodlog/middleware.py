@@ -1,6 +1,21 @@
+import json
+import logging
+import re
+import threading
+import time
+from collections import Counter
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
 from django.utils import timezone
 import pytz
 
+logger = logging.getLogger(__name__)
+
+_IN_LIST = re.compile(r"\bIN \((?:%s, )*%s\)")
+_LITERAL = re.compile(r"\b\d+\b|'[^']*'")
+
 
 class TimezoneMiddleware:
     def __init__(self, get_response):
@@ -13,3 +28,148 @@ class TimezoneMiddleware:
         else:
             timezone.deactivate()
         return self.get_response(request)
+
+
+def sql_shape(sql: str) -> str:
+    """
+    SQL with literals and IN lists collapsed, the same for queries differing only by parameters
+    """
+
+    return _LITERAL.sub("?", _IN_LIST.sub("IN (...)", sql))
+
+
+class QueryStats:
+    """
+    Queries of one request, collected by a database execute wrapper
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.queries = []
+        self.shapes = Counter()
+        self._lock = threading.Lock()
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = time.perf_counter() - started
+            with self._lock:
+                self.count += 1
+                self.duration += duration
+                self.queries.append((duration, context["connection"].alias, sql))
+                self.shapes[sql_shape(sql)] += 1
+
+    def slowest(self, limit: int) -> list:
+        return sorted(self.queries, key=lambda query: query[0], reverse=True)[:limit]
+
+
+# Stats of the request being served. Context variables follow the request into the threads of sync_to_async(),
+# where its sync code runs with connections of those threads under ASGI.
+_request_stats = ContextVar("foodlog_request_stats", default=None)
+
+
+def _collect_query(execute, sql, params, many, context):
+    stats = _request_stats.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    return stats(execute, sql, params, many, context)
+
+
+def add_query_collector(connection) -> None:
+    """
+    Time queries of the connection for the request being served, connected to `connection_created`
+    """
+
+    if _collect_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_collect_query)
+
+
+class QueryTimingMiddleware:
+    """
+    Per request query count, database time, the slowest queries and the view time.
+
+    They are logged as one JSON line by the `foodlog.middleware` logger and, if QUERY_TIMING_HEADER is on,
+    sent in the Server-Timing header (durations only, no SQL). A warning is logged when the same SQL shape repeats more than
+    QUERY_TIMING_REPEAT_THRESHOLD times, which usually means N+1 queries. Queries run while a streaming
+    response is consumed are not counted. Async under ASGI, so async views aren't run through a thread;
+    queries of all threads serving the request are counted.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.slowest = getattr(settings, "QUERY_TIMING_SLOWEST", 3)
+        self.repeat_threshold = getattr(settings, "QUERY_TIMING_REPEAT_THRESHOLD", 10)
+        self.header = getattr(settings, "QUERY_TIMING_HEADER", False)
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+
+        stats = QueryStats()
+        request._view_started = None
+        started = time.perf_counter()
+        token = _request_stats.set(stats)
+        try:
+            response = self.get_response(request)
+        finally:
+            _request_stats.reset(token)
+        return self._report(request, response, stats, started)
+
+    async def __acall__(self, request):
+        stats = QueryStats()
+        request._view_started = None
+        started = time.perf_counter()
+        token = _request_stats.set(stats)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _request_stats.reset(token)
+        return self._report(request, response, stats, started)
+
+    def _report(self, request, response, stats: QueryStats, started: float):
+        """
+        Server-Timing header and log lines of the finished request
+        """
+
+        total = time.perf_counter() - started
+        view = total if request._view_started is None else time.perf_counter() - request._view_started
+
+        if self.header:
+            timings = [
+                f'db;dur={stats.duration * 1000:.1f};desc="{stats.count} queries"',
+                f"view;dur={view * 1000:.1f}",
+                f"total;dur={total * 1000:.1f}",
+            ]
+            timings += [f"sql-{index};dur={duration * 1000:.1f}"
+                        for index, (duration, _, _) in enumerate(stats.slowest(self.slowest), start=1)]
+            response.headers["Server-Timing"] = ", ".join(
+                filter(None, [response.headers.get("Server-Timing"), *timings])
+            )
+
+        logger.info(json.dumps({
+            "method": request.method,
+            "path": request.path,
+            "status": response.status_code,
+            "total_ms": round(total * 1000, 1),
+            "view_ms": round(view * 1000, 1),
+            "db_ms": round(stats.duration * 1000, 1),
+            "queries": stats.count,
+            "slowest": [{"ms": round(duration * 1000, 1), "db": alias, "sql": sql[:200]}
+                        for duration, alias, sql in stats.slowest(self.slowest)],
+        }))
+        for shape, count in stats.shapes.most_common():
+            if count <= self.repeat_threshold:
+                break
+            logger.warning("N+1 suspected on %s %s: %s queries of %s", request.method, request.path, count, shape)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request._view_started = time.perf_counter()
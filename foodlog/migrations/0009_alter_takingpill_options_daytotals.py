@@ -0,0 +1,38 @@
+# Generated by Django 5.1.15 on 2026-10-17 04:21
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('foodlog', '0008_alter_product_lactose_free'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='takingpill',
+            options={'verbose_name': 'Pill Taking', 'verbose_name_plural': 'Pill Taking'},
+        ),
+        migrations.CreateModel(
+            name='DayTotals',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('energy', models.FloatField(default=0, verbose_name='Energy')),
+                ('proteins', models.FloatField(default=0, verbose_name='Proteins')),
+                ('fats', models.FloatField(default=0, verbose_name='Fats')),
+                ('carbs', models.FloatField(default=0, verbose_name='Carbs')),
+                ('sugar', models.FloatField(default=0, verbose_name='Sugar')),
+                ('salt', models.FloatField(default=0, verbose_name='Salt')),
+                ('weight', models.IntegerField(default=0, verbose_name='Weight')),
+                ('dishes_count', models.IntegerField(default=0, verbose_name='Dishes count')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Updated at')),
+                ('day', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='totals', to='foodlog.day', verbose_name='Day')),
+            ],
+            options={
+                'verbose_name': 'Day Totals',
+                'verbose_name_plural': 'Day Totals',
+            },
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.1.15 on 2026-10-17 04:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('foodlog', '0010_product_product_title_trgm'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='dish',
+            index=models.Index(fields=['meal', 'id'], name='dish_meal_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='meal',
+            index=models.Index(fields=['day', 'time', 'id'], name='meal_day_time_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='note',
+            index=models.Index(fields=['day', 'time', 'id'], name='note_day_time_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='takingpill',
+            index=models.Index(fields=['day', 'time', 'id'], name='takingpill_day_time_id_idx'),
+        ),
+    ]
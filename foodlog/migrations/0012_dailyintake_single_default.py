@@ -0,0 +1,29 @@
+# Generated by Django 5.1.15 on 2026-10-17 04:36
+
+from django.db import migrations, models
+
+
+def keep_latest_default(apps, schema_editor):
+    """
+    Only the most recently updated default intake stays default
+    """
+
+    DailyIntake = apps.get_model('foodlog', 'DailyIntake')
+    latest = DailyIntake.objects.filter(default=True).order_by('-updated_at', '-id').first()
+    if latest:
+        DailyIntake.objects.filter(default=True).exclude(pk=latest.pk).update(default=False)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('foodlog', '0011_journal_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(keep_latest_default, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='dailyintake',
+            constraint=models.UniqueConstraint(condition=models.Q(('default', True)), fields=('default',), name='dailyintake_single_default'),
+        ),
+    ]
@@ -0,0 +1,92 @@
+# Generated by Django 5.1.15 on 2026-10-17 04:42
+
+from django.db import migrations, models
+from django.db.models import Sum
+
+NUTRIENTS = ('energy', 'proteins', 'fats', 'carbs', 'sugar', 'salt')
+BATCH_SIZE = 1000
+
+
+def backfill_snapshots(apps, schema_editor):
+    """
+    Snapshot nutrients of existing dishes from their products, batch by batch in id order
+    """
+
+    Dish = apps.get_model('foodlog', 'Dish')
+    last_id = 0
+    while True:
+        rows = list(
+            Dish.objects.filter(id__gt=last_id).order_by('id')
+            .values('id', 'weight', *(f'product__{nutrient}' for nutrient in NUTRIENTS))[:BATCH_SIZE]
+        )
+        if not rows:
+            return
+
+        dishes = []
+        for row in rows:
+            dish = Dish(id=row['id'])
+            for nutrient in NUTRIENTS:
+                value = row[f'product__{nutrient}']
+                setattr(dish, nutrient, None if value is None else round(value * row['weight'] / 100, 2))
+            dishes.append(dish)
+        Dish.objects.bulk_update(dishes, NUTRIENTS)
+        last_id = rows[-1]['id']
+
+
+def refresh_day_totals(apps, schema_editor):
+    """
+    Day totals become sums of the rounded dish snapshots
+    """
+
+    Dish = apps.get_model('foodlog', 'Dish')
+    DayTotals = apps.get_model('foodlog', 'DayTotals')
+    sums = (Dish.objects.order_by().values('meal__day_id')
+            .annotate(**{f'sum_{nutrient}': Sum(nutrient) for nutrient in NUTRIENTS}))
+    totals = {row['meal__day_id']: row for row in sums}
+    rows = list(DayTotals.objects.filter(day_id__in=totals))
+    for day_totals in rows:
+        for nutrient in NUTRIENTS:
+            setattr(day_totals, nutrient, totals[day_totals.day_id][f'sum_{nutrient}'] or 0)
+    DayTotals.objects.bulk_update(rows, NUTRIENTS, batch_size=BATCH_SIZE)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('foodlog', '0012_dailyintake_single_default'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='dish',
+            name='carbs',
+            field=models.FloatField(default=0, editable=False, verbose_name='Carbs'),
+        ),
+        migrations.AddField(
+            model_name='dish',
+            name='energy',
+            field=models.FloatField(default=0, editable=False, verbose_name='Energy'),
+        ),
+        migrations.AddField(
+            model_name='dish',
+            name='fats',
+            field=models.FloatField(default=0, editable=False, verbose_name='Fats'),
+        ),
+        migrations.AddField(
+            model_name='dish',
+            name='proteins',
+            field=models.FloatField(default=0, editable=False, verbose_name='Proteins'),
+        ),
+        migrations.AddField(
+            model_name='dish',
+            name='salt',
+            field=models.FloatField(blank=True, editable=False, null=True, verbose_name='Salt'),
+        ),
+        migrations.AddField(
+            model_name='dish',
+            name='sugar',
+            field=models.FloatField(blank=True, editable=False, null=True, verbose_name='Sugar'),
+        ),
+        migrations.RunPython(backfill_snapshots, migrations.RunPython.noop),
+        migrations.RunPython(refresh_day_totals, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.1.4 on 2026-10-17 05:18
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('foodlog', '0014_product_title_upper_trgm'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='dish',
+            name='meal',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.RESTRICT, to='foodlog.meal', verbose_name='Meal'),
+        ),
+        migrations.AlterField(
+            model_name='meal',
+            name='day',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.RESTRICT, to='foodlog.day', verbose_name='Day'),
+        ),
+        migrations.AlterField(
+            model_name='note',
+            name='day',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.RESTRICT, to='foodlog.day', verbose_name='Day'),
+        ),
+        migrations.AlterField(
+            model_name='takingpill',
+            name='day',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.RESTRICT, to='foodlog.day', verbose_name='Day'),
+        ),
+    ]
@@ -1,4 +1,54 @@
-from django.db import models
+from django.contrib.postgres.indexes import GinIndex, OpClass
+from django.db import models, transaction
+from django.db.models import Count, F, FloatField, Q, Sum
+from django.db.models.functions import Coalesce, Upper
+
+TOTAL_PARAMS = ("energy", "proteins", "fats", "carbs")
+ROLLUP_PARAMS = TOTAL_PARAMS + ("sugar", "salt")
+
+
+def _totals_annotations(dish_path: str, params: tuple = TOTAL_PARAMS) -> dict:
+    """
+    Annotations summing dish nutrient snapshots in SQL, `dish_path` leads to Dish from the annotated model
+    """
+
+    annotations = {"total_weight": Coalesce(Sum(f"{dish_path}weight"), 0)}
+    for param in params:
+        annotations[f"total_{param}"] = Coalesce(Sum(f"{dish_path}{param}"), 0.0, output_field=FloatField())
+    return annotations
+
+
+class DayQuerySet(models.QuerySet):
+    """
+    Day queryset
+    """
+
+    def with_totals(self):
+        """
+        Days with energy, proteins, fats, carbs and weight computed by a single aggregate query
+        """
+
+        return self.annotate(**_totals_annotations("meal__dish__"))
+
+    def with_rollup(self):
+        """
+        Days with totals read from the DayTotals rollup, NULL (so computed on access) if it has no row yet
+        """
+
+        return self.annotate(**{f"total_{param}": F(f"totals__{param}") for param in TOTAL_PARAMS + ("weight",)})
+
+
+class MealQuerySet(models.QuerySet):
+    """
+    Meal queryset
+    """
+
+    def with_totals(self):
+        """
+        Meals with energy, proteins, fats, carbs and weight computed by a single aggregate query
+        """
+
+        return self.annotate(**_totals_annotations("dish__"))
 
 
 class Product(models.Model):
@@ -34,6 +84,11 @@ class Product(models.Model):
         ordering = ['title']
         verbose_name = "Product"
         verbose_name_plural = "Products"
+        indexes = [
+            # Trigram index for title__icontains of admin search and autocomplete, which PostgreSQL gets as
+            # UPPER("title"::text) LIKE UPPER(%s), so the index is on the same expression
+            GinIndex(OpClass(Upper("title"), name="gin_trgm_ops"), name="product_title_upper_trgm"),
+        ]
 
 
 class DailyIntake(models.Model):
@@ -55,17 +110,23 @@ class DailyIntake(models.Model):
 
     def save(self, *args, **kwargs) -> None:
         """
-        There must be only 1 default intake
+        There must be only 1 default intake, enforced by the `dailyintake_single_default` constraint
         """
 
-        if self.default:
-            DailyIntake.objects.update(default=False)
-        else:
-            another = DailyIntake.objects.filter(default=True).first()
-            if not another:
+        with transaction.atomic():
+            if self.default:
+                DailyIntake.objects.filter(default=True).exclude(pk=self.pk).update(default=False)
+            elif not DailyIntake.objects.filter(default=True).exists():
                 self.default = True
 
-        super().save(*args, **kwargs)
+            super().save(*args, **kwargs)
+
+    def validate_constraints(self, exclude=None) -> None:
+        """
+        A new default is allowed in forms, save() resets the previous one
+        """
+
+        super().validate_constraints(exclude={*(exclude or ()), "default"})
 
     def __str__(self) -> str:
         """
@@ -81,6 +142,9 @@ class DailyIntake(models.Model):
 
         verbose_name = "Daily Intake"
         verbose_name_plural = "Daily Intakes"
+        constraints = [
+            models.UniqueConstraint(fields=["default"], condition=Q(default=True), name="dailyintake_single_default"),
+        ]
 
 
 class Day(models.Model):
@@ -94,25 +158,37 @@ class Day(models.Model):
     created_at = models.DateTimeField("Created at", auto_now_add=True)
     updated_at = models.DateTimeField("Updated at", auto_now=True)
 
+    objects = DayQuerySet.as_manager()
+
+    def _total(self, param: str):
+        """
+        Sum of meals parameter, taken from `with_totals()` annotation if present
+        """
+
+        annotated = getattr(self, f"total_{param}", None)
+        if annotated is not None:
+            return round(annotated, 2)
+        return round(sum([getattr(meal, param) for meal in self.meal_set.all()]), 2)
+
     @property
     def energy(self):
-        return round(sum([meal.energy for meal in self.meal_set.all()]), 2)
+        return self._total("energy")
 
     @property
     def proteins(self):
-        return round(sum([meal.proteins for meal in self.meal_set.all()]), 2)
+        return self._total("proteins")
 
     @property
     def fats(self):
-        return round(sum([meal.fats for meal in self.meal_set.all()]), 2)
+        return self._total("fats")
 
     @property
     def carbs(self):
-        return round(sum([meal.carbs for meal in self.meal_set.all()]), 2)
+        return self._total("carbs")
 
     @property
     def weight(self):
-        return round(sum([meal.weight for meal in self.meal_set.all()]), 2)
+        return self._total("weight")
 
     def __str__(self) -> str:
         """
@@ -161,30 +237,43 @@ class Meal(models.Model):
     """
 
     title = models.ForeignKey(MealTitle, null=False, blank=False, on_delete=models.RESTRICT, verbose_name="Title")
-    day = models.ForeignKey(Day, null=False, blank=False, on_delete=models.RESTRICT, verbose_name="Day")
+    # meal_day_time_id_idx starts with the key, so it needs no index of its own
+    day = models.ForeignKey(Day, null=False, blank=False, on_delete=models.RESTRICT, db_index=False, verbose_name="Day")
     time = models.TimeField("Time", null=True, blank=True)
     created_at = models.DateTimeField("Created at", auto_now_add=True)
     updated_at = models.DateTimeField("Updated at", auto_now=True)
 
+    objects = MealQuerySet.as_manager()
+
+    def _total(self, param: str):
+        """
+        Sum of dishes parameter, taken from `with_totals()` annotation if present
+        """
+
+        annotated = getattr(self, f"total_{param}", None)
+        if annotated is not None:
+            return round(annotated, 2)
+        return round(sum([getattr(dish, param) for dish in self.dish_set.all()]), 2)
+
     @property
     def energy(self):
-        return round(sum([dish.energy for dish in self.dish_set.all()]), 2)
+        return self._total("energy")
 
     @property
     def proteins(self):
-        return round(sum([dish.proteins for dish in self.dish_set.all()]), 2)
+        return self._total("proteins")
 
     @property
     def fats(self):
-        return round(sum([dish.fats for dish in self.dish_set.all()]), 2)
+        return self._total("fats")
 
     @property
     def carbs(self):
-        return round(sum([dish.carbs for dish in self.dish_set.all()]), 2)
+        return self._total("carbs")
 
     @property
     def weight(self):
-        return round(sum([dish.weight for dish in self.dish_set.all()]), 2)
+        return self._total("weight")
 
     def __str__(self) -> str:
         """
@@ -200,39 +289,81 @@ class Meal(models.Model):
 
         verbose_name = "Meal"
         verbose_name_plural = "Meals"
+        indexes = [
+            # Meals of the day ordered by time
+            models.Index(name="meal_day_time_id_idx", fields=["day", "time", "id"]),
+        ]
 
 
 class Dish(models.Model):
     """
-    Dish in a meal
+    Dish in a meal. Nutrients are snapshotted from the product when the dish is written,
+    so later product edits don't change the history.
     """
 
     product = models.ForeignKey(Product, null=False, blank=False, on_delete=models.RESTRICT, verbose_name="Product")
-    meal = models.ForeignKey(Meal, null=False, blank=False, on_delete=models.RESTRICT, verbose_name="Meal")
+    # dish_meal_id_idx starts with the key, so it needs no index of its own
+    meal = models.ForeignKey(Meal, null=False, blank=False, on_delete=models.RESTRICT,
+                             db_index=False, verbose_name="Meal")
     weight = models.IntegerField("Weight", null=False, blank=False)
     note = models.CharField("Note", max_length=150, null=True, blank=True)
+    energy = models.FloatField("Energy", null=False, blank=False, default=0, editable=False)
+    proteins = models.FloatField("Proteins", null=False, blank=False, default=0, editable=False)
+    fats = models.FloatField("Fats", null=False, blank=False, default=0, editable=False)
+    carbs = models.FloatField("Carbs", null=False, blank=False, default=0, editable=False)
+    sugar = models.FloatField("Sugar", null=True, blank=True, editable=False)
+    salt = models.FloatField("Salt", null=True, blank=True, editable=False)
     created_at = models.DateTimeField("Created at", auto_now_add=True)
     updated_at = models.DateTimeField("Updated at", auto_now=True)
 
-    @property
-    def energy(self):
-        return round(self.product.energy * self.weight / 100, 2)
+    SNAPSHOT_FIELDS = ROLLUP_PARAMS
 
-    @property
-    def proteins(self):
-        return round(self.product.proteins * self.weight / 100, 2)
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        """
+        Remember product and weight the snapshot was taken for
+        """
 
-    @property
-    def fats(self):
-        return round(self.product.fats * self.weight / 100, 2)
+        instance = super().from_db(db, field_names, values)
+        instance._snapshot_of = (instance.__dict__.get("product_id"), instance.__dict__.get("weight"))
+        return instance
 
-    @property
-    def carbs(self):
-        return round(self.product.carbs * self.weight / 100, 2)
+    def _nutrient(self, param: str):
+        """
+        Product parameter, from the loaded product if any, otherwise from the product cache
+        """
+
+        if Dish.product.is_cached(self):
+            return getattr(self.product, param)
+
+        from .caches import product_cache
+        return product_cache.get(self.product_id)[param]
+
+    def snapshot(self) -> "Dish":
+        """
+        Compute nutrients of the dish from the current product values, returns the dish for bulk creation
+        """
+
+        for param in self.SNAPSHOT_FIELDS:
+            value = self._nutrient(param)
+            setattr(self, param, None if value is None else round(value * self.weight / 100, 2))
+        self._snapshot_of = (self.product_id, self.weight)
+        return self
+
+    def save(self, *args, **kwargs) -> None:
+        """
+        Take the snapshot for a new dish or a changed product or weight
+        """
+
+        if getattr(self, "_snapshot_of", None) != (self.product_id, self.weight):
+            self.snapshot()
+            if kwargs.get("update_fields") is not None:
+                kwargs["update_fields"] = {*kwargs["update_fields"], *self.SNAPSHOT_FIELDS}
+        super().save(*args, **kwargs)
 
     @property
     def lactose_free(self):
-        return self.product.lactose_free
+        return self._nutrient("lactose_free")
 
     def __str__(self) -> str:
         """
@@ -248,6 +379,10 @@ class Dish(models.Model):
 
         verbose_name = "Dish"
         verbose_name_plural = "Dishes"
+        indexes = [
+            # Dishes of the meal ordered by id
+            models.Index(name="dish_meal_id_idx", fields=["meal", "id"]),
+        ]
 
 
 class Pill(models.Model):
@@ -283,7 +418,8 @@ class TakingPill(models.Model):
     """
 
     pill = models.ForeignKey(Pill, null=False, blank=False, on_delete=models.RESTRICT, verbose_name="Pill")
-    day = models.ForeignKey(Day, null=False, blank=False, on_delete=models.RESTRICT, verbose_name="Day")
+    # takingpill_day_time_id_idx starts with the key, so it needs no index of its own
+    day = models.ForeignKey(Day, null=False, blank=False, on_delete=models.RESTRICT, db_index=False, verbose_name="Day")
     time = models.TimeField("Time", null=True, blank=True)
     is_taken = models.BooleanField("Is taken", null=False, blank=False, default=False)
     note = models.CharField("Note", max_length=150, null=True, blank=True)
@@ -304,6 +440,10 @@ class TakingPill(models.Model):
 
         verbose_name = "Pill Taking"
         verbose_name_plural = "Pill Taking"
+        indexes = [
+            # Pill takings of the day ordered by time, backwards for TakingPillAdmin ordering
+            models.Index(name="takingpill_day_time_id_idx", fields=["day", "time", "id"]),
+        ]
 
 
 class Note(models.Model):
@@ -311,7 +451,8 @@ class Note(models.Model):
     Notes for the day
     """
 
-    day = models.ForeignKey(Day, null=False, blank=False, on_delete=models.RESTRICT, verbose_name="Day")
+    # note_day_time_id_idx starts with the key, so it needs no index of its own
+    day = models.ForeignKey(Day, null=False, blank=False, on_delete=models.RESTRICT, db_index=False, verbose_name="Day")
     time = models.TimeField("Time", null=True, blank=True)
     note = models.TextField("Note", null=False, blank=False)
     created_at = models.DateTimeField("Created at", auto_now_add=True)
@@ -331,3 +472,81 @@ class Note(models.Model):
 
         verbose_name = "Note"
         verbose_name_plural = "Notes"
+        indexes = [
+            # Notes of the day ordered by time, backwards for NoteAdmin ordering
+            models.Index(name="note_day_time_id_idx", fields=["day", "time", "id"]),
+        ]
+
+
+class DayTotals(models.Model):
+    """
+    Materialized totals of the day, kept up to date by signals
+    """
+
+    day = models.OneToOneField(Day, null=False, blank=False, on_delete=models.CASCADE, related_name="totals",
+                               verbose_name="Day")
+    energy = models.FloatField("Energy", null=False, blank=False, default=0)
+    proteins = models.FloatField("Proteins", null=False, blank=False, default=0)
+    fats = models.FloatField("Fats", null=False, blank=False, default=0)
+    carbs = models.FloatField("Carbs", null=False, blank=False, default=0)
+    sugar = models.FloatField("Sugar", null=False, blank=False, default=0)
+    salt = models.FloatField("Salt", null=False, blank=False, default=0)
+    weight = models.IntegerField("Weight", null=False, blank=False, default=0)
+    dishes_count = models.IntegerField("Dishes count", null=False, blank=False, default=0)
+    updated_at = models.DateTimeField("Updated at", auto_now=True)
+
+    FIELDS = ROLLUP_PARAMS + ("weight", "dishes_count")
+
+    @classmethod
+    def compute(cls, day_ids) -> dict:
+        """
+        Totals of the given days straight from dishes, by one grouped query
+        """
+
+        rows = (Dish.objects.filter(meal__day_id__in=day_ids)
+                .order_by()
+                .values("meal__day_id")
+                .annotate(**_totals_annotations("", ROLLUP_PARAMS), total_dishes_count=Count("id")))
+        result = {day_id: {field: 0 for field in cls.FIELDS} for day_id in day_ids}
+        for row in rows:
+            result[row["meal__day_id"]] = {field: row[f"total_{field}"] for field in cls.FIELDS}
+        return result
+
+    @classmethod
+    def refresh(cls, day_ids) -> None:
+        """
+        Recompute and upsert totals of the given days.
+
+        The days are locked first, in id order, until the end of the transaction: a concurrent refresh of the
+        same day waits and then sums dishes committed meanwhile, instead of overwriting the totals with sums
+        that miss them. The lock doesn't block inserting rows referencing the days.
+        """
+
+        day_ids = set(day_ids)
+        if not day_ids:
+            return
+
+        with transaction.atomic():
+            locked = Day.objects.filter(id__in=day_ids).order_by("id").select_for_update(no_key=True)
+            computed = cls.compute(list(locked.values_list("id", flat=True)))
+            cls.objects.bulk_create(
+                [cls(day_id=day_id, **values) for day_id, values in computed.items()],
+                update_conflicts=True,
+                unique_fields=["day"],
+                update_fields=[*cls.FIELDS, "updated_at"],
+            )
+
+    def __str__(self) -> str:
+        """
+        String representation
+        """
+
+        return f"{self.day_id} {self.energy}"
+
+    class Meta:
+        """
+        Model configuration
+        """
+
+        verbose_name = "Day Totals"
+        verbose_name_plural = "Day Totals"
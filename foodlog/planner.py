@@ -0,0 +1,119 @@
+import logging
+import time
+
+import numpy as np
+
+from .models import TOTAL_PARAMS, DailyIntake, Product
+
+logger = logging.getLogger(__name__)
+
+
+def product_matrix(product_ids=None, lactose_free_only: bool = False) -> tuple:
+    """
+    Candidate products and their nutrients per gram as a products x TOTAL_PARAMS array, by one query
+    """
+
+    products = Product.objects.order_by("id")
+    if product_ids:
+        products = products.filter(id__in=product_ids)
+    if lactose_free_only:
+        products = products.filter(lactose_free=True)
+
+    products = list(products.only("id", "title", "lactose_free", *TOTAL_PARAMS))
+    matrix = np.array([[getattr(product, param) for param in TOTAL_PARAMS] for product in products],
+                      dtype=float).reshape(len(products), len(TOTAL_PARAMS)) / 100
+    return products, matrix
+
+
+def nnls(a: np.ndarray, b: np.ndarray, tolerance: float = 1e-10) -> np.ndarray:
+    """
+    Minimize ||a @ x - b|| subject to x >= 0, Lawson-Hanson active set method.
+    The solution has at most as many positive entries as `a` has rows.
+    """
+
+    n = a.shape[1]
+    x = np.zeros(n)
+    passive = np.zeros(n, dtype=bool)
+    gradient = a.T @ b
+    for _ in range(3 * n):
+        if passive.all() or np.max(np.where(passive, -np.inf, gradient)) <= tolerance:
+            break
+        passive[np.argmax(np.where(passive, -np.inf, gradient))] = True
+        while True:
+            z = np.zeros(n)
+            z[passive] = np.linalg.lstsq(a[:, passive], b, rcond=None)[0]
+            if np.all(z[passive] > tolerance):
+                x = z
+                break
+            # Step back to the boundary and release variables that would become negative
+            blocking = passive & (z <= tolerance)
+            alpha = np.min(np.divide(x[blocking], x[blocking] - z[blocking], out=np.zeros(int(blocking.sum())),
+                                     where=x[blocking] > z[blocking]))
+            x = x + alpha * (z - x)
+            passive &= x > tolerance
+            x[~passive] = 0
+        gradient = a.T @ (b - a @ x)
+    return x
+
+
+def bounded_least_squares(a: np.ndarray, b: np.ndarray, upper: np.ndarray) -> np.ndarray:
+    """
+    Minimize ||a @ x - b|| subject to 0 <= x <= upper.
+    Variables exceeding their bound are fixed at it one by one, the rest is solved by NNLS again.
+    """
+
+    x = np.zeros(a.shape[1])
+    fixed = np.zeros(a.shape[1], dtype=bool)
+    while not fixed.all():
+        free = np.flatnonzero(~fixed)
+        x[free] = nnls(a[:, free], b - a[:, fixed] @ upper[fixed])
+        excess = x[free] - upper[free]
+        if np.max(excess) <= 0:
+            break
+        worst = free[np.argmax(excess)]
+        fixed[worst], x[worst] = True, upper[worst]
+    return x
+
+
+def plan_day(intake: DailyIntake, product_ids=None, lactose_free_only: bool = False, max_dishes: int = 6,
+             max_weight: int = 400, min_weight: int = 10, step: int = 5) -> dict:
+    """
+    Dish weights of at most `max_dishes` candidate products closest to the energy and macro targets of the intake.
+
+    Errors are relative to each target, so energy in kcal doesn't outweigh grams of macros. The bounded problem is
+    solved over all candidates first, which picks few products, then again over the heaviest `max_dishes` of them.
+    Weights are rounded to `step` grams and dishes lighter than `min_weight` are dropped.
+    """
+
+    started = time.perf_counter()
+    targets = np.array([getattr(intake, param) or 0 for param in TOTAL_PARAMS], dtype=float)
+    rows = targets > 0
+    products, matrix = product_matrix(product_ids, lactose_free_only)
+
+    a = matrix.T[rows] / targets[rows, None]
+    b = np.ones(int(rows.sum()))
+    upper = np.full(len(products), float(max_weight))
+    weights = bounded_least_squares(a, b, upper)
+
+    chosen = np.argsort(weights)[::-1][:max_dishes]
+    chosen = chosen[weights[chosen] >= min_weight]
+    weights = np.round(bounded_least_squares(a[:, chosen], b, upper[chosen]) / step) * step
+    keep = weights >= min_weight
+    chosen, weights = chosen[keep], weights[keep]
+
+    nutrients = matrix[chosen] * weights[:, None]
+    totals = nutrients.sum(axis=0)
+    plan = {
+        "intake": intake,
+        "dishes": [(products[index], int(weight)) for index, weight in zip(chosen, weights)],
+        "rows": [{"product": products[index], "weight": int(weight),
+                  **{param: round(float(value), 2) for param, value in zip(TOTAL_PARAMS, values)}}
+                 for index, weight, values in zip(chosen, weights, nutrients)],
+        "totals": {param: round(float(total), 2) for param, total in zip(TOTAL_PARAMS, totals)},
+        "targets": {param: float(target) for param, target in zip(TOTAL_PARAMS, targets)},
+        "candidates": len(products),
+        "elapsed_ms": round((time.perf_counter() - started) * 1000, 2),
+    }
+    logger.debug("Planned %s dishes out of %s products for %s in %s ms",
+                 len(plan["dishes"]), len(products), intake, plan["elapsed_ms"])
+    return plan
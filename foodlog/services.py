@@ -0,0 +1,115 @@
+import logging
+
+from django.db import transaction
+from django.db.models import Prefetch
+
+from .caches import day_table_cache, product_cache
+from .models import DailyIntake, Day, DayTotals, Dish, Meal, MealTitle, TakingPill
+
+logger = logging.getLogger(__name__)
+
+BULK_BATCH_SIZE = 1000
+
+
+def copy_day(source: Day, target: Day) -> None:
+    """
+    Copy meals with dishes and pill takings (not taken yet) from source day to target day.
+    Rows are inserted by a few bulk queries inside one transaction, so a failure leaves nothing copied.
+    """
+
+    copy_day_to_days(source, [target])
+
+
+def copy_day_to_days(source: Day, targets: list) -> None:
+    """
+    Copy meals with dishes and pill takings (not taken yet) from source day to every target day.
+    Copied dishes snapshot the current product nutrients. Query count does not depend on the number of targets.
+    """
+
+    if not targets:
+        return
+
+    meals = list(
+        source.meal_set
+        .prefetch_related(Prefetch("dish_set", queryset=Dish.objects.select_related("product").order_by("id")))
+        .order_by("time", "id")
+    )
+    takingpills = list(source.takingpill_set.order_by("time", "id"))
+    target_meals = [(target, meal) for target in targets for meal in meals]
+
+    with transaction.atomic():
+        new_meals = Meal.objects.bulk_create([
+            Meal(day=target, title_id=meal.title_id, time=meal.time) for target, meal in target_meals
+        ], batch_size=BULK_BATCH_SIZE)
+        Dish.objects.bulk_create([
+            Dish(meal=new_meal, product=dish.product, weight=dish.weight, note=dish.note).snapshot()
+            for (_, meal), new_meal in zip(target_meals, new_meals)
+            for dish in meal.dish_set.all()
+        ], batch_size=BULK_BATCH_SIZE)
+        TakingPill.objects.bulk_create([
+            TakingPill(day=target, pill_id=takingpill.pill_id, time=takingpill.time, is_taken=False,
+                       note=takingpill.note)
+            for target in targets
+            for takingpill in takingpills
+        ], batch_size=BULK_BATCH_SIZE)
+        DayTotals.refresh([target.pk for target in targets])
+        day_table_cache.invalidate([target.pk for target in targets])
+
+    logger.debug("Copied %s meals and %s pill takings from %s to %s days",
+                 len(meals), len(takingpills), source, len(targets))
+
+
+def apply_day_template(source: Day, dates: list, daily_intake: DailyIntake | None = None,
+                       skip_filled: bool = True) -> list:
+    """
+    Copy source day to every date, creating missing days in one batch.
+    Days that already have meals or pill takings are skipped if `skip_filled`. Returns the filled days.
+    """
+
+    dates = sorted(set(dates) - {source.date})
+    with transaction.atomic():
+        Day.objects.bulk_create([
+            Day(date=date, daily_intake=daily_intake or source.daily_intake) for date in dates
+        ], ignore_conflicts=True, batch_size=BULK_BATCH_SIZE)
+        targets = Day.objects.filter(date__in=dates).order_by("date")
+        if skip_filled:
+            targets = targets.filter(meal__isnull=True, takingpill__isnull=True)
+        targets = list(targets.distinct())
+        copy_day_to_days(source, targets)
+    return targets
+
+
+def products_changed(product_ids) -> None:
+    """
+    Refresh what depends on products changed by bulk queries, which bypass model signals.
+    Dishes keep their nutrient snapshots, use `resnapshot_dishes` to apply new product values to them.
+    """
+
+    product_ids = set(product_ids)
+    if not product_ids:
+        return
+
+    day_table_cache.invalidate(
+        Dish.objects.filter(product_id__in=product_ids).values_list("meal__day_id", flat=True).distinct()
+    )
+    product_cache.invalidate()
+    transaction.on_commit(product_cache.invalidate)
+
+
+def save_meal_plan(date, title: MealTitle, dishes: list, daily_intake: DailyIntake | None = None,
+                   time=None) -> Meal:
+    """
+    Write proposed dishes, pairs of product and weight, as a meal of the day, creating the day if missing
+    """
+
+    with transaction.atomic():
+        day, _ = Day.objects.get_or_create(date=date, defaults={"daily_intake": daily_intake})
+        meal = Meal.objects.create(day=day, title=title, time=time)
+        Dish.objects.bulk_create([
+            Dish(meal=meal, product=product, weight=weight).snapshot() for product, weight in dishes
+        ], batch_size=BULK_BATCH_SIZE)
+        DayTotals.refresh([day.pk])
+        day_table_cache.invalidate([day.pk])
+
+    logger.debug("Saved meal plan of %s dishes to %s", len(dishes), day)
+    return meal
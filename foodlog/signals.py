@@ -0,0 +1,229 @@
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import Group
+from django.db import transaction
+from django.db.backends.signals import connection_created
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from .auth import invalidate_users
+from .caches import day_table_cache, default_intake_cache, product_cache
+from .middleware import add_query_collector
+from .models import DailyIntake, Day, DayTotals, Dish, Meal, MealTitle, Note, Pill, Product, TakingPill
+from .similar import product_index
+
+
+@receiver(post_save, sender=Day)
+def day_saved(sender, instance: Day, created: bool, **kwargs) -> None:
+    """
+    New day starts with empty totals
+    """
+
+    day_table_cache.invalidate([instance.pk])
+    if created and not kwargs.get("raw"):
+        DayTotals.refresh([instance.pk])
+
+
+@receiver(pre_save, sender=Dish)
+def dish_pre_save(sender, instance: Dish, **kwargs) -> None:
+    """
+    Remember the day the dish belonged to before saving
+    """
+
+    instance._previous_day_id = (
+        Meal.objects.filter(dish__id=instance.pk).values_list("day_id", flat=True).first() if instance.pk else None
+    )
+
+
+@receiver(post_save, sender=Dish)
+def dish_saved(sender, instance: Dish, **kwargs) -> None:
+    """
+    Refresh totals of the dish day (and the previous one if the dish moved)
+    """
+
+    day_ids = {instance.meal.day_id, getattr(instance, "_previous_day_id", None)} - {None}
+    day_table_cache.invalidate(day_ids)
+    if not kwargs.get("raw"):
+        DayTotals.refresh(day_ids)
+
+
+@receiver(post_delete, sender=Dish)
+def dish_deleted(sender, instance: Dish, **kwargs) -> None:
+    """
+    Refresh totals of the dish day
+    """
+
+    day_ids = set(Meal.objects.filter(id=instance.meal_id).values_list("day_id", flat=True))
+    day_table_cache.invalidate(day_ids)
+    DayTotals.refresh(day_ids)
+
+
+@receiver(pre_save, sender=Meal)
+def meal_pre_save(sender, instance: Meal, **kwargs) -> None:
+    """
+    Remember the day the meal belonged to before saving
+    """
+
+    instance._previous_day_id = (
+        Meal.objects.filter(id=instance.pk).values_list("day_id", flat=True).first() if instance.pk else None
+    )
+
+
+@receiver(post_save, sender=Meal)
+def meal_saved(sender, instance: Meal, **kwargs) -> None:
+    """
+    Refresh totals of both days if the meal moved to another day
+    """
+
+    previous_day_id = getattr(instance, "_previous_day_id", None)
+    day_table_cache.invalidate({instance.day_id, previous_day_id} - {None})
+    if kwargs.get("raw") or previous_day_id in (None, instance.day_id):
+        return
+    DayTotals.refresh([previous_day_id, instance.day_id])
+
+
+@receiver(post_delete, sender=Meal)
+def meal_deleted(sender, instance: Meal, **kwargs) -> None:
+    """
+    Refresh totals of the meal day
+    """
+
+    day_table_cache.invalidate([instance.day_id])
+    DayTotals.refresh([instance.day_id])
+
+
+@receiver(post_save, sender=TakingPill)
+@receiver(post_delete, sender=TakingPill)
+@receiver(post_save, sender=Note)
+@receiver(post_delete, sender=Note)
+def day_item_changed(sender, instance: TakingPill | Note, **kwargs) -> None:
+    """
+    Pill takings and notes are shown in the day table
+    """
+
+    day_table_cache.invalidate([instance.day_id])
+
+
+@receiver(post_save, sender=MealTitle)
+def meal_title_saved(sender, instance: MealTitle, **kwargs) -> None:
+    """
+    Meal titles are shown in day tables
+    """
+
+    day_table_cache.invalidate(Meal.objects.filter(title=instance).values_list("day_id", flat=True).distinct())
+
+
+@receiver(post_save, sender=Pill)
+def pill_saved(sender, instance: Pill, **kwargs) -> None:
+    """
+    Pill titles are shown in day tables
+    """
+
+    day_table_cache.invalidate(TakingPill.objects.filter(pill=instance).values_list("day_id", flat=True).distinct())
+
+
+@receiver(post_save, sender=DailyIntake)
+@receiver(post_delete, sender=DailyIntake)
+def daily_intake_changed(sender, instance: DailyIntake, **kwargs) -> None:
+    """
+    Daily intake is shown in the day table
+    """
+
+    day_table_cache.invalidate(Day.objects.filter(daily_intake_id=instance.pk).values_list("id", flat=True))
+
+
+@receiver(post_save, sender=DailyIntake)
+@receiver(post_delete, sender=DailyIntake)
+def default_intake_changed(sender, instance: DailyIntake, **kwargs) -> None:
+    """
+    Any saved or deleted intake may be or become the default, drop it now and once more after commit
+    """
+
+    default_intake_cache.invalidate()
+    transaction.on_commit(default_intake_cache.invalidate)
+
+
+@receiver(post_save, sender=Product)
+def product_saved(sender, instance: Product, **kwargs) -> None:
+    """
+    Product title and lactose flag are shown in day tables, dish nutrients are snapshots and stay as they are
+    """
+
+    day_table_cache.invalidate(Dish.objects.filter(product=instance).values_list("meal__day_id", flat=True).distinct())
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def product_changed(sender, instance: Product, **kwargs) -> None:
+    """
+    Drop the product from the nutrients cache now and once more after commit,
+    so other workers can't cache values read before the transaction is committed
+    """
+
+    product_id = instance.pk
+    product_cache.invalidate(product_id)
+    transaction.on_commit(lambda: product_cache.invalidate(product_id))
+
+
+@receiver(post_save, sender=Product)
+def product_vector_saved(sender, instance: Product, **kwargs) -> None:
+    """
+    Upsert the product into the similarity index once committed
+    """
+
+    product_id = instance.pk
+    transaction.on_commit(lambda: product_index.update([product_id]))
+
+
+@receiver(post_delete, sender=Product)
+def product_vector_deleted(sender, instance: Product, **kwargs) -> None:
+    """
+    Exclude the product from similar products once committed
+    """
+
+    product_id = instance.pk
+    transaction.on_commit(lambda: product_index.remove(product_id))
+
+
+User = get_user_model()
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def user_changed(sender, instance, **kwargs) -> None:
+    """
+    Drop the cached user, e.g. after a password or active flag change, now and once more after commit,
+    so concurrent requests can't cache the user read before the transaction is committed
+    """
+
+    user_id = instance.pk
+    invalidate_users([user_id])
+    transaction.on_commit(lambda: invalidate_users([user_id]))
+
+
+@receiver(post_delete, sender=Group)
+@receiver(m2m_changed, sender=User.groups.through)
+@receiver(m2m_changed, sender=User.user_permissions.through)
+@receiver(m2m_changed, sender=Group.permissions.through)
+def permissions_changed(sender, instance, **kwargs) -> None:
+    """
+    Drop cached permissions: of the user if its own groups or permissions changed, of all users otherwise.
+    Dropped now and once more after commit, as in `user_changed`.
+    """
+
+    if kwargs.get("action", "post_delete").startswith("pre_"):
+        return
+    if isinstance(instance, User) and not kwargs.get("reverse"):
+        user_ids = [instance.pk]
+    else:
+        user_ids = list(User.objects.values_list("pk", flat=True))
+    invalidate_users(user_ids)
+    transaction.on_commit(lambda: invalidate_users(user_ids))
+
+
+@receiver(connection_created)
+def connection_opened(sender, connection, **kwargs) -> None:
+    """
+    Queries of every connection, in any thread, are timed for the request being served
+    """
+
+    add_query_collector(connection)
@@ -0,0 +1,173 @@
+import logging
+import threading
+import time
+
+import numpy as np
+from django.conf import settings
+from django.core.cache import caches
+
+from .caches import bump_version, shared_version
+from .models import ROLLUP_PARAMS, Product
+
+logger = logging.getLogger(__name__)
+
+
+class ProductVectorIndex:
+    """
+    In-process k-NN index of products by nutrients per 100 g.
+
+    Vectors are standardized by the spread of each nutrient over the catalogue at build time, missing sugar
+    or salt count as 0. Queries are a matrix-vector product and a partial sort over all rows. Saved products
+    are upserted into the index one by one. If a Django cache alias is configured, other workers see a new
+    version there and rebuild their index, at most `check_interval` seconds late. Products change rarely, and
+    a rebuild can't miss rows committed late or deleted, as loading changes since the last load could.
+    """
+
+    FIELDS = ROLLUP_PARAMS
+    VERSION_KEY = "foodlog:products:vectors:version"
+
+    def __init__(self, alias: str | None = None, check_interval: float = 1.0):
+        self.alias = alias
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._ids = None
+        self._vectors = None
+        self._norms = None
+        self._lactose_free = None
+        self._rows = {}
+        self._scale = None
+        self._version = None
+        self._checked_at = 0.0
+
+    @property
+    def shared(self):
+        return caches[self.alias] if self.alias else None
+
+    def nearest(self, product_id: int, k: int = 10, lactose_free_only: bool = False) -> list:
+        """
+        Up to `k` products closest to the product, as (product, distance) pairs, the product itself excluded
+        """
+
+        self._sync()
+        with self._lock:
+            row = self._rows.get(product_id)
+            if row is None:
+                return []
+            query = self._vectors[row]
+            distances = self._norms - 2 * (self._vectors @ query) + query @ query
+            distances[row] = np.inf
+            if lactose_free_only:
+                distances[~self._lactose_free] = np.inf
+            count = min(len(distances), k)
+            nearest = np.argpartition(distances, count - 1)[:count] if count else []
+            nearest = sorted(nearest, key=lambda index: distances[index])
+            candidates = [(int(self._ids[index]), float(np.sqrt(max(distances[index], 0)))) for index in nearest
+                          if np.isfinite(distances[index])]
+
+        products = Product.objects.in_bulk([product_id for product_id, _ in candidates])
+        return [(products[product_id], distance) for product_id, distance in candidates if product_id in products]
+
+    def update(self, product_ids=None) -> None:
+        """
+        Upsert the products into the index, or rebuild it for all products, if it's built,
+        and let other workers load them too
+        """
+
+        if self._ids is not None:
+            if product_ids is None:
+                self._build()
+            else:
+                self._upsert(self._load(product_ids))
+        self._bump_version()
+
+    def remove(self, product_id: int) -> None:
+        """
+        Exclude the product from results and let other workers drop it too
+        """
+
+        self._remove([product_id])
+        self._bump_version()
+
+    def _remove(self, product_ids) -> None:
+        with self._lock:
+            for product_id in product_ids:
+                row = self._rows.pop(product_id, None)
+                if row is not None:
+                    self._norms[row] = np.inf
+
+    def _bump_version(self) -> None:
+        if self.shared:
+            self._version = bump_version(self.shared, self.VERSION_KEY)
+
+    def _sync(self) -> None:
+        """
+        Build the index on first use, rebuild it when other workers changed products
+        """
+
+        if self._ids is None:
+            self._build()
+            return
+        if not self.shared or time.monotonic() - self._checked_at < self.check_interval:
+            return
+
+        version = shared_version(self.shared, self.VERSION_KEY)
+        self._checked_at = time.monotonic()
+        if version != self._version:
+            self._build()
+
+    def _build(self) -> None:
+        started = time.perf_counter()
+        # Read before the products, a change committed meanwhile makes the next check rebuild again
+        version = shared_version(self.shared, self.VERSION_KEY) if self.shared else None
+        rows = list(Product.objects.order_by("id").values_list("id", "lactose_free", *self.FIELDS))
+        raw = self._raw(rows)
+        scale = raw.std(axis=0) if len(rows) else np.ones(len(self.FIELDS), dtype=np.float32)
+        scale[scale == 0] = 1
+
+        with self._lock:
+            self._scale = scale
+            self._ids = np.array([row[0] for row in rows], dtype=np.int64)
+            self._vectors = raw / scale
+            self._norms = (self._vectors ** 2).sum(axis=1)
+            self._lactose_free = np.array([row[1] is True for row in rows], dtype=bool)
+            self._rows = {product_id: index for index, product_id in enumerate(self._ids.tolist())}
+        self._version = version
+        self._checked_at = time.monotonic()
+        logger.debug("Built product vector index of %s products in %.1f ms", len(rows),
+                     (time.perf_counter() - started) * 1000)
+
+    def _load(self, product_ids) -> list:
+        return list(Product.objects.filter(id__in=product_ids).values_list("id", "lactose_free", *self.FIELDS))
+
+    def _upsert(self, rows: list) -> None:
+        if not rows:
+            return
+
+        vectors = self._raw(rows) / self._scale
+        with self._lock:
+            new = [index for index, row in enumerate(rows) if row[0] not in self._rows]
+            for index, row in enumerate(rows):
+                if row[0] in self._rows:
+                    self._vectors[self._rows[row[0]]] = vectors[index]
+                    self._lactose_free[self._rows[row[0]]] = row[1] is True
+            if new:
+                start = len(self._ids)
+                self._ids = np.concatenate([self._ids, [rows[index][0] for index in new]])
+                self._vectors = np.vstack([self._vectors, vectors[new]])
+                self._norms = np.concatenate([self._norms, np.zeros(len(new), dtype=np.float32)])
+                self._lactose_free = np.concatenate([self._lactose_free, [rows[index][1] is True for index in new]])
+                for offset, index in enumerate(new):
+                    self._rows[rows[index][0]] = start + offset
+            for row in rows:
+                position = self._rows[row[0]]
+                self._norms[position] = self._vectors[position] @ self._vectors[position]
+
+    def _raw(self, rows: list) -> np.ndarray:
+        return np.array([[value or 0 for value in row[2:]] for row in rows],
+                        dtype=np.float32).reshape(len(rows), len(self.FIELDS))
+
+
+product_index = ProductVectorIndex(
+    alias=settings.PRODUCT_INDEX_ALIAS,
+    check_interval=settings.PRODUCT_INDEX_CHECK_INTERVAL,
+)
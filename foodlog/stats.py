@@ -0,0 +1,220 @@
+import datetime
+
+import numpy as np
+from django.db.models import Avg, Case, Count, DateField, F, OuterRef, Q, Subquery, Value, When
+from django.db.models.functions import Coalesce, NullIf, TruncMonth, TruncWeek, TruncYear
+
+from .models import TOTAL_PARAMS, Day, Pill, TakingPill
+
+PERIODS = {"week": TruncWeek, "month": TruncMonth, "year": TruncYear}
+
+# Pill takings are grouped by time of day into these slots, [start, end) hours
+TIME_SLOTS = (("Night", 0, 6), ("Morning", 6, 12), ("Afternoon", 12, 18), ("Evening", 18, 24))
+NO_TIME_SLOT = "No time"
+
+# Energy within this fraction of the daily intake counts as on target, as the green color of the Day table
+TARGET_TOLERANCE = 0.05
+
+
+def fraction_band(fraction: float) -> str:
+    """
+    CSS class of the band of actual to target ratio, as colors of the Day table
+    """
+
+    if fraction > 1.10:
+        return "fl-fraction-more-110-color"
+    if fraction > 1.05:
+        return "fl-fraction-more-105-color"
+    if fraction < 0.90:
+        return "fl-fraction-less-090-color"
+    if fraction < 0.95:
+        return "fl-fraction-less-095-color"
+    return "fl-good-color"
+
+
+def moving_average(values: list, window: int) -> list:
+    """
+    Trailing moving average, None until the window is filled or when the window contains a gap
+    """
+
+    result = [None] * len(values)
+    if window < 1 or len(values) < window:
+        return result
+
+    series = np.array([np.nan if value is None else value for value in values], dtype=float)
+    averages = np.convolve(series, np.ones(window) / window, mode="valid")
+    for index, value in enumerate(averages, start=window - 1):
+        if not np.isnan(value):
+            result[index] = float(value)
+    return result
+
+
+def period_starts(period: str, first: datetime.date, last: datetime.date) -> list:
+    """
+    Starts of all periods from the one starting at `first` to the one starting at `last`
+    """
+
+    starts = [first]
+    while starts[-1] < last:
+        start = starts[-1]
+        if period == "week":
+            starts.append(start + datetime.timedelta(days=7))
+        elif period == "month":
+            starts.append(datetime.date(start.year + start.month // 12, start.month % 12 + 1, 1))
+        else:
+            starts.append(datetime.date(start.year + 1, 1, 1))
+    return starts
+
+
+def nutrition_stats(period: str = "month", date_from: datetime.date | None = None,
+                    date_to: datetime.date | None = None, window: int = 3) -> list:
+    """
+    Per period averages of daily energy and macros, their targets and energy adherence to the daily intake.
+
+    Computed by one grouped query over the DayTotals rollup, days without dishes are not counted.
+    Moving averages over `window` periods are added as `<param>_moving`, None if one of the periods has no days.
+    """
+
+    if period not in PERIODS:
+        raise ValueError(f"Unknown period {period!r}, expected one of {', '.join(PERIODS)}")
+
+    days = Day.objects.filter(totals__dishes_count__gt=0)
+    if date_from:
+        days = days.filter(date__gte=date_from)
+    if date_to:
+        days = days.filter(date__lte=date_to)
+
+    energy, target = F("totals__energy"), F("daily_intake__energy")
+    with_target = Q(daily_intake__energy__gt=0)
+    aggregates = {
+        "days": Count("id"),
+        "days_with_target": Count("id", filter=with_target),
+        "over_days": Count("id", filter=with_target & Q(totals__energy__gt=target * (1 + TARGET_TOLERANCE))),
+        "under_days": Count("id", filter=with_target & Q(totals__energy__lt=target * (1 - TARGET_TOLERANCE))),
+        "energy_ratio": Avg(energy / target, filter=with_target),
+    }
+    for param in TOTAL_PARAMS:
+        aggregates[param] = Avg(f"totals__{param}")
+        aggregates[f"{param}_target"] = Avg(f"daily_intake__{param}")
+
+    rows = list(
+        days.order_by()
+        .annotate(period=PERIODS[period]("date"))
+        .values("period")
+        .annotate(**aggregates)
+        .order_by("period")
+    )
+
+    for row in rows:
+        on_target = row["days_with_target"] - row["over_days"] - row["under_days"]
+        row["on_target_days"] = on_target
+        row["adherence"] = on_target / row["days_with_target"] if row["days_with_target"] else None
+
+    # Periods without days aren't in the result, the moving averages must not span them
+    series = [None] * len(rows)
+    if rows:
+        by_start = {row["period"]: row for row in rows}
+        series = [by_start.get(start) for start in period_starts(period, rows[0]["period"], rows[-1]["period"])]
+    for param in TOTAL_PARAMS:
+        for row, value in zip(series, moving_average([row and row[param] for row in series], window)):
+            if row is not None:
+                row[f"{param}_moving"] = value
+    return rows
+
+
+def calendar_days(years) -> dict:
+    """
+    Logged days of the years with energy and macros, their daily intake targets and ratios, grouped by year.
+
+    One query over the DayTotals rollup, a ratio is None if the day has no daily intake or its target is 0.
+    """
+
+    years = sorted(set(years))
+    result = {year: [] for year in years}
+    if not years:
+        return result
+
+    annotations = {}
+    for param in TOTAL_PARAMS:
+        annotations[param] = F(f"totals__{param}")
+        annotations[f"{param}_target"] = F(f"daily_intake__{param}")
+        annotations[f"{param}_ratio"] = F(f"totals__{param}") / NullIf(F(f"daily_intake__{param}"), 0.0)
+    rows = (Day.objects.filter(date__gte=datetime.date(years[0], 1, 1), date__lte=datetime.date(years[-1], 12, 31),
+                               totals__dishes_count__gt=0)
+            .order_by("date")
+            .values("date", **annotations))
+    for row in rows:
+        if row["date"].year in result:
+            result[row["date"].year].append(row)
+    return result
+
+
+def _ratio(taken: int, scheduled: int) -> float | None:
+    return taken / scheduled if scheduled else None
+
+
+def pill_adherence(period: str = "month", date_from: datetime.date | None = None,
+                   date_to: datetime.date | None = None, pill_ids=None, today: datetime.date | None = None) -> list:
+    """
+    Per pill adherence: taken ratio per period, missed doses by time of day and the current streak.
+
+    Not taken doses of `today` aren't due yet and are left out. The streak is the number of days with taken doses
+    since the last day with a missed dose, regardless of the date range. Three grouped queries over TakingPill.
+    """
+
+    if period not in PERIODS:
+        raise ValueError(f"Unknown period {period!r}, expected one of {', '.join(PERIODS)}")
+
+    today = today or datetime.date.today()
+    takings = TakingPill.objects.filter(Q(day__date__lt=today) | Q(is_taken=True)).order_by()
+    if date_from:
+        takings = takings.filter(day__date__gte=date_from)
+    if date_to:
+        takings = takings.filter(day__date__lte=date_to)
+    pills = Pill.objects.order_by("title")
+    if pill_ids is not None:
+        takings = takings.filter(pill_id__in=pill_ids)
+        pills = pills.filter(id__in=pill_ids)
+
+    counts = {"scheduled": Count("id"), "taken": Count("id", filter=Q(is_taken=True))}
+    periods = (takings.annotate(period=PERIODS[period]("day__date"))
+               .values("pill_id", "period").annotate(**counts).order_by("pill_id", "period"))
+    slot = Case(*[When(time__gte=datetime.time(start), then=Value(name)) for name, start, _ in reversed(TIME_SLOTS)],
+                default=Value(NO_TIME_SLOT))
+    slots = takings.annotate(slot=slot).values("pill_id", "slot").annotate(**counts)
+
+    last_missed = (TakingPill.objects.filter(pill=OuterRef("pk"), is_taken=False, day__date__lt=today)
+                   .order_by("-day__date").values("day__date")[:1])
+    streak = (TakingPill.objects
+              .filter(pill=OuterRef("pk"), is_taken=True,
+                      day__date__gt=Coalesce(OuterRef("last_missed"), Value(datetime.date.min),
+                                             output_field=DateField()))
+              .order_by().values("pill").annotate(days=Count("day", distinct=True)).values("days"))
+    pills = pills.annotate(last_missed=Subquery(last_missed), streak=Coalesce(Subquery(streak), 0))
+
+    result = {pill.pk: {
+        "pill_id": pill.pk,
+        "title": pill.title,
+        "streak": pill.streak,
+        "last_missed": pill.last_missed,
+        "scheduled": 0,
+        "taken": 0,
+        "periods": [],
+        "slots": {name: {"slot": name, "scheduled": 0, "missed": 0} for name, *_ in TIME_SLOTS + ((NO_TIME_SLOT,),)},
+    } for pill in pills}
+    for row in periods:
+        stats = result[row["pill_id"]]
+        stats["scheduled"] += row["scheduled"]
+        stats["taken"] += row["taken"]
+        stats["periods"].append({"period": row["period"], "scheduled": row["scheduled"], "taken": row["taken"],
+                                 "ratio": _ratio(row["taken"], row["scheduled"])})
+    for row in slots:
+        result[row["pill_id"]]["slots"][row["slot"]].update(scheduled=row["scheduled"],
+                                                            missed=row["scheduled"] - row["taken"])
+
+    for stats in result.values():
+        stats["ratio"] = _ratio(stats["taken"], stats["scheduled"])
+        stats["slots"] = [slot for slot in stats["slots"].values() if slot["scheduled"]]
+        for slot in stats["slots"]:
+            slot["missed_ratio"] = slot["missed"] / slot["scheduled"]
+    return list(result.values())
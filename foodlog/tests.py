@@ -1,3 +1,626 @@
-from django.test import TestCase
+import datetime
+import importlib
+import io
+import json
+import tempfile
+from pathlib import Path
+from unittest import mock
 
-# Create your tests here.
+import numpy as np
+from asgiref.sync import iscoroutinefunction
+from django.contrib import admin
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.db.migrations.executor import MigrationExecutor
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+
+from .auth import CachedModelBackend, user_cache_key, user_state
+from .caches import DefaultIntakeCache, ProductCache, day_table_cache, pill_adherence_cache, product_cache
+from .middleware import QueryTimingMiddleware
+from .models import DailyIntake, Day, DayTotals, Dish, Meal, MealTitle, Note, Pill, Product, TakingPill
+from .planner import bounded_least_squares, nnls, plan_day
+from .services import save_meal_plan
+from .stats import nutrition_stats
+from .similar import ProductVectorIndex
+
+
+class JournalTestCase(TestCase):
+    """
+    A daily intake, a meal title and a few products to log dishes of
+    """
+
+    def setUp(self):
+        # The cache is shared by processes, entries of other runs must not leak into tests
+        cache.clear()
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.intake = DailyIntake.objects.create(title="Norm", default=True, energy=2000, proteins=100, fats=70,
+                                                carbs=250)
+        cls.breakfast = MealTitle.objects.create(title="Breakfast")
+        cls.oatmeal = Product.objects.create(title="Oatmeal", energy=68, proteins=2.4, fats=1.4, carbs=12, sugar=1,
+                                             lactose_free=True)
+        cls.juice = Product.objects.create(title="Juice", energy=45, proteins=0.7, fats=0, carbs=10, salt=0.01)
+
+    def log(self, date: datetime.date, *dishes) -> Day:
+        """
+        Day with one meal of (product, weight) dishes
+        """
+
+        day, _ = Day.objects.get_or_create(date=date, defaults={"daily_intake": self.intake})
+        meal = Meal.objects.create(day=day, title=self.breakfast, time=datetime.time(8))
+        for product, weight in dishes:
+            Dish.objects.create(meal=meal, product=product, weight=weight)
+        return day
+
+
+class CalendarTests(JournalTestCase):
+
+    def setUp(self):
+        super().setUp()
+        user = get_user_model().objects.create_superuser("admin", "admin@example.com", "password")
+        self.client.force_login(user)
+
+    def test_zero_total_day(self):
+        self.log(datetime.date(2024, 3, 1), (self.juice, 500))
+
+        response = self.client.get(reverse("admin:foodlog_day_calendar"), {"param": "fats"})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, "2024-03-01: fats 0 of 70 (0%)")
+        self.assertEqual(DayTotals.objects.get(day__date=datetime.date(2024, 3, 1)).fats, 0)
+
+
+class DayTableCacheTests(JournalTestCase):
+
+    def test_version_dropped_after_commit(self):
+        day = self.log(datetime.date(2024, 3, 1), (self.oatmeal, 100))
+        version_key = day_table_cache._version_key(day.pk)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Dish.objects.create(meal=day.meal_set.get(), product=self.juice, weight=200)
+            # A concurrent render caches the version derived before the commit
+            cache.set(version_key, "stale")
+
+        self.assertIsNone(cache.get(version_key))
+
+    def test_renamed_meal_title_and_pill_shown(self):
+        day = self.log(datetime.date(2024, 3, 1), (self.oatmeal, 100))
+        vitamin = Pill.objects.create(title="Vitamin D")
+        TakingPill.objects.create(pill=vitamin, day=day, is_taken=True)
+        day_admin = admin.site._registry[Day]
+        self.assertIn("Breakfast", day_admin.meals_and_dishes(day))
+
+        self.breakfast.title = "Early breakfast"
+        self.breakfast.save()
+        vitamin.title = "Vitamin D3"
+        vitamin.save()
+
+        table = day_admin.meals_and_dishes(day)
+        self.assertIn("Early breakfast", table)
+        self.assertIn("Vitamin D3", table)
+
+
+class CachedUserTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+
+    def test_user_dropped_after_commit(self):
+        user = get_user_model().objects.create_user("user", password="old")
+        old = get_user_model().objects.get(pk=user.pk)
+        backend = CachedModelBackend()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            user.set_password("new")
+            user.save()
+            # A concurrent request caches the user read before the commit
+            cache.set(user_cache_key(user.pk), user_state(old))
+
+        self.assertIsNone(cache.get(user_cache_key(user.pk)))
+        self.assertTrue(backend.get_user(user.pk).check_password("new"))
+
+    def test_password_not_cached(self):
+        user = get_user_model().objects.create_user("user", password="secret", first_name="Ann")
+        user.last_login = datetime.datetime(2024, 1, 1, tzinfo=datetime.UTC)
+        user.save()
+        backend = CachedModelBackend()
+        backend.get_user(user.pk)
+
+        self.assertNotIn(user.password, repr(cache.get(user_cache_key(user.pk))))
+        with self.assertNumQueries(0):
+            cached = backend.get_user(user.pk)
+            self.assertEqual(cached.get_session_auth_hash(), user.get_session_auth_hash())
+            self.assertEqual(cached.first_name, "Ann")
+
+        # Saving the cached user keeps the password and other fields
+        cached.first_name = "Anna"
+        cached.save()
+        user.refresh_from_db()
+        self.assertEqual(user.first_name, "Anna")
+        self.assertTrue(user.check_password("secret"))
+        self.assertEqual(user.last_login, datetime.datetime(2024, 1, 1, tzinfo=datetime.UTC))
+
+        # A changed password gives its own session hash
+        cached = backend.get_user(user.pk)
+        cached.set_password("other")
+        self.assertNotEqual(cached.get_session_auth_hash(), user.get_session_auth_hash())
+
+
+class ImportProductsTests(JournalTestCase):
+
+    def import_products(self, name: str, content: str) -> str:
+        with tempfile.TemporaryDirectory() as directory:
+            path = Path(directory) / name
+            path.write_text(content, encoding="utf-8")
+            stdout, stderr = io.StringIO(), io.StringIO()
+            call_command("import_products", str(path), stdout=stdout, stderr=stderr)
+        return stdout.getvalue() + stderr.getvalue()
+
+    def test_lactose_free_change_invalidates_cache(self):
+        self.assertTrue(product_cache.get(self.oatmeal.pk)["lactose_free"])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.import_products("products.csv", "title,energy,proteins,fats,carbs,sugar,lactose_free\n"
+                                                 "Oatmeal,68,2.4,1.4,12,1,no\n")
+
+        self.assertFalse(product_cache.get(self.oatmeal.pk)["lactose_free"])
+
+    def test_non_object_rows_rejected(self):
+        output = self.import_products("products.ndjson", '["Oatmeal", 68]\n42\n"Juice"\n'
+                                                         '{"title": "Rice", "energy": 130, "proteins": 2.7, '
+                                                         '"fats": 0.3, "carbs": 28}\n')
+
+        self.assertIn("4 rows", output)
+        self.assertIn("1 created, 0 updated, 3 rejected", output)
+        self.assertIn("Row 1 rejected: row is not an object", output)
+        self.assertTrue(Product.objects.filter(title="Rice").exists())
+
+        output = self.import_products("products.json", '[{"title": "Pasta", "energy": 158, "proteins": 5.8, '
+                                                        '"fats": 0.9, "carbs": 31}, null]')
+        self.assertIn("1 created, 0 updated, 1 rejected", output)
+
+    def test_malformed_ndjson_lines_rejected(self):
+        output = self.import_products("products.ndjson", '{"title": "Rice", "energy": 130, "proteins": 2.7,\n'
+                                                         '{"title": "Pasta", "energy": 158, "proteins": 5.8, '
+                                                         '"fats": 0.9, "carbs": 31}\n')
+
+        self.assertIn("1 created, 0 updated, 1 rejected", output)
+        self.assertIn("Row 1 rejected: malformed JSON", output)
+        self.assertTrue(Product.objects.filter(title="Pasta").exists())
+
+    def test_missing_columns_kept(self):
+        Product.objects.filter(pk=self.oatmeal.pk).update(note="Rolled", rate=5, salt=0.01)
+
+        self.import_products("products.csv", "title,energy,proteins,fats,carbs\n"
+                                             "Oatmeal,70,2.5,1.5,12\n"
+                                             "Rice,130,2.7,0.3,28\n")
+        self.import_products("products.ndjson", '{"title": "Juice", "energy": 46, "proteins": 0.7, "fats": 0, '
+                                                '"carbs": 10, "sugar": 9, "note": null}\n')
+
+        oatmeal = Product.objects.get(pk=self.oatmeal.pk)
+        self.assertEqual((oatmeal.energy, oatmeal.sugar, oatmeal.salt, oatmeal.note, oatmeal.rate,
+                          oatmeal.lactose_free), (70, 1, 0.01, "Rolled", 5, True))
+        juice = Product.objects.get(pk=self.juice.pk)
+        self.assertEqual((juice.energy, juice.sugar, juice.salt, juice.note), (46, 9, 0.01, None))
+        self.assertEqual(Product.objects.get(title="Rice").energy, 130)
+
+
+class ProductVectorIndexTests(JournalTestCase):
+
+    def test_lactose_free_only(self):
+        # Closer products aren't lactose-free, farther ones are
+        for n in range(20):
+            Product.objects.create(title=f"Near {n}", energy=68 + n, proteins=2.4, fats=1.4, carbs=12, sugar=1,
+                                   lactose_free=False)
+        for n in range(5):
+            Product.objects.create(title=f"Far {n}", energy=300 + n, proteins=20, fats=10, carbs=40,
+                                   lactose_free=True)
+        index = ProductVectorIndex()
+
+        similar = index.nearest(self.oatmeal.pk, k=3, lactose_free_only=True)
+
+        self.assertEqual(len(similar), 3)
+        self.assertTrue(all(product.lactose_free for product, _ in similar))
+        self.assertEqual([product.title for product, _ in index.nearest(self.oatmeal.pk, k=2)], ["Near 0", "Near 1"])
+
+    def test_deletion_reaches_other_workers(self):
+        for n in range(5):
+            Product.objects.create(title=f"Near {n}", energy=68 + n, proteins=2.4, fats=1.4, carbs=12, sugar=1)
+        worker, other = ProductVectorIndex("default", check_interval=0), ProductVectorIndex("default", check_interval=0)
+        self.assertEqual(len(other.nearest(self.oatmeal.pk, k=5)), 5)
+
+        near = Product.objects.get(title="Near 0")
+        near_id = near.pk
+        near.delete()
+        worker.remove(near_id)
+
+        similar = other.nearest(self.oatmeal.pk, k=5)
+        self.assertNotIn(near_id, other._rows)
+        self.assertEqual(len(similar), 5)
+        self.assertNotIn("Near 0", [product.title for product, _ in similar])
+
+    def test_late_commit_reaches_other_workers(self):
+        worker, other = ProductVectorIndex("default", check_interval=0), ProductVectorIndex("default", check_interval=0)
+        self.assertEqual(other.nearest(self.oatmeal.pk, k=1)[0][0], self.juice)
+        started = self.juice.updated_at
+        Product.objects.create(title="Porridge", energy=70, proteins=2.5, fats=1.5, carbs=12, sugar=1)
+        worker.update()
+        self.assertEqual(other.nearest(self.oatmeal.pk, k=1)[0][0].title, "Porridge")
+
+        # Committed after the other worker loaded the porridge, but saved before it
+        Product.objects.filter(pk=self.juice.pk).update(energy=68, proteins=2.4, fats=1.4, carbs=12, sugar=1,
+                                                        updated_at=started)
+        worker.update([self.juice.pk])
+        self.assertEqual(other.nearest(self.oatmeal.pk, k=1)[0][0], self.juice)
+
+        # The version expired or was culled
+        cache.delete(ProductVectorIndex.VERSION_KEY)
+        Product.objects.filter(title="Porridge").delete()
+        self.assertEqual(len(other.nearest(self.oatmeal.pk, k=5)), 1)
+
+    def test_generated_products_reach_other_workers(self):
+        other = ProductVectorIndex("default", check_interval=0)
+        self.assertEqual(len(other.nearest(self.oatmeal.pk, k=50)), 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command("generate_journal", "--products", "20", "--meals-per-day", "1", stdout=io.StringIO())
+
+        self.assertEqual(len(other.nearest(self.oatmeal.pk, k=50)), Product.objects.count() - 1)
+
+
+class DishSnapshotTests(JournalTestCase):
+
+    def assertTotalsMatch(self, day: Day):
+        totals = DayTotals.objects.get(day=day)
+        for field, value in DayTotals.compute([day.pk])[day.pk].items():
+            self.assertAlmostEqual(getattr(totals, field), value, places=6, msg=field)
+
+    def test_snapshot_on_create(self):
+        day = self.log(datetime.date(2024, 3, 1), (self.oatmeal, 250))
+        dish = Dish.objects.get()
+
+        self.assertEqual((dish.energy, dish.proteins, dish.fats, dish.carbs, dish.sugar, dish.salt),
+                         (170, 6, 3.5, 30, 2.5, None))
+        self.assertTotalsMatch(day)
+        self.assertEqual(DayTotals.objects.get(day=day).energy, 170)
+
+    def test_product_edit_keeps_history(self):
+        day = self.log(datetime.date(2024, 3, 1), (self.oatmeal, 100))
+        self.oatmeal.energy = 100
+        self.oatmeal.save()
+
+        dish = Dish.objects.get()
+        self.assertEqual(dish.energy, 68)
+        dish.note = "Tasty"
+        dish.save()
+        self.assertEqual(Dish.objects.get().energy, 68)
+        self.assertEqual(DayTotals.objects.get(day=day).energy, 68)
+
+    def test_resnapshot_on_weight_and_product_change(self):
+        day = self.log(datetime.date(2024, 3, 1), (self.oatmeal, 100))
+        dish = Dish.objects.get()
+
+        dish.weight = 200
+        dish.save(update_fields=["weight"])
+        self.assertEqual(Dish.objects.get().energy, 136)
+
+        dish = Dish.objects.get()
+        dish.product = self.juice
+        dish.save()
+        dish = Dish.objects.get()
+        self.assertEqual((dish.energy, dish.fats, dish.sugar, dish.salt), (90, 0, None, 0.02))
+        self.assertTotalsMatch(day)
+
+    def test_resnapshot_dishes(self):
+        day = self.log(datetime.date(2024, 3, 1), (self.oatmeal, 100), (self.juice, 200))
+        other = self.log(datetime.date(2024, 3, 2), (self.juice, 100))
+        Product.objects.filter(pk=self.oatmeal.pk).update(energy=100, sugar=None)
+
+        with self.assertRaises(CommandError):
+            call_command("resnapshot_dishes", stdout=io.StringIO())
+        call_command("resnapshot_dishes", "--product", str(self.oatmeal.pk), stdout=io.StringIO())
+
+        self.assertEqual(Dish.objects.get(product=self.oatmeal).energy, 100)
+        self.assertIsNone(Dish.objects.get(product=self.oatmeal).sugar)
+        self.assertEqual(DayTotals.objects.get(day=day).energy, 190)
+        self.assertTotalsMatch(day)
+        self.assertTotalsMatch(other)
+
+        Product.objects.filter(pk=self.juice.pk).update(energy=50)
+        call_command("resnapshot_dishes", "--all", "--batch-size", "1", stdout=io.StringIO())
+        self.assertEqual(DayTotals.objects.get(day=other).energy, 50)
+        self.assertTotalsMatch(day)
+
+    def test_resnapshot_dishes_refreshes_day_table(self):
+        day = self.log(datetime.date(2024, 3, 1), (self.oatmeal, 100))
+        day_admin = admin.site._registry[Day]
+        self.assertIn("68.00", day_admin.meals_and_dishes(day))
+        Product.objects.filter(pk=self.oatmeal.pk).update(energy=100)
+
+        call_command("resnapshot_dishes", "--product", str(self.oatmeal.pk), stdout=io.StringIO())
+
+        table = day_admin.meals_and_dishes(day)
+        self.assertIn("100.00", table)
+        self.assertNotIn("68.00", table)
+
+
+class SnapshotBackfillMigrationTests(TransactionTestCase):
+    migrate_from = [("foodlog", "0012_dailyintake_single_default")]
+    migrate_to = [("foodlog", "0013_dish_nutrient_snapshots")]
+
+    def migrate(self, targets):
+        executor = MigrationExecutor(connection)
+        executor.loader.build_graph()
+        executor.migrate(targets)
+        return executor.loader.project_state(targets).apps
+
+    def tearDown(self):
+        self.migrate(MigrationExecutor(connection).loader.graph.leaf_nodes("foodlog"))
+
+    def test_backfill(self):
+        apps = self.migrate(self.migrate_from)
+        Product = apps.get_model("foodlog", "Product")
+        Day = apps.get_model("foodlog", "Day")
+        DayTotals = apps.get_model("foodlog", "DayTotals")
+        Meal = apps.get_model("foodlog", "Meal")
+        Dish = apps.get_model("foodlog", "Dish")
+        oatmeal = Product.objects.create(title="Oatmeal", energy=68, proteins=2.4, fats=1.4, carbs=12, sugar=1)
+        day = Day.objects.create(date=datetime.date(2024, 3, 1))
+        meal = Meal.objects.create(day=day, title=apps.get_model("foodlog", "MealTitle").objects.create(title="Lunch"))
+        for weight in (100, 150, 250):
+            Dish.objects.create(meal=meal, product=oatmeal, weight=weight)
+        DayTotals.objects.create(day=day, energy=1, dishes_count=3)
+
+        migration = importlib.import_module("foodlog.migrations.0013_dish_nutrient_snapshots")
+        with mock.patch.object(migration, "BATCH_SIZE", 2):
+            apps = self.migrate(self.migrate_to)
+
+        dishes = apps.get_model("foodlog", "Dish").objects.order_by("weight")
+        self.assertEqual([(dish.energy, dish.sugar, dish.salt) for dish in dishes],
+                         [(68, 1, None), (102, 1.5, None), (170, 2.5, None)])
+        totals = apps.get_model("foodlog", "DayTotals").objects.get(day_id=day.pk)
+        self.assertEqual((totals.energy, totals.sugar, totals.salt), (340, 5, 0))
+
+
+class PlannerTests(JournalTestCase):
+
+    def test_nnls_exact(self):
+        a = np.array([[1.0, 0, 1], [0, 1, 1], [1, 1, 0]])
+        x = np.array([2.0, 0, 3])
+
+        np.testing.assert_allclose(nnls(a, a @ x), x, atol=1e-9)
+
+    def test_nnls_nonnegative(self):
+        a = np.array([[1.0, 0], [0, 1]])
+
+        np.testing.assert_allclose(nnls(a, np.array([-1.0, 2])), [0, 2], atol=1e-9)
+
+    def test_bounded_upper_hit(self):
+        a = np.array([[1.0, 1], [0, 1]])
+        x = bounded_least_squares(a, np.array([5.0, 4]), np.array([10.0, 2]))
+
+        np.testing.assert_allclose(x, [3, 2], atol=1e-9)
+
+    def test_plan_exact(self):
+        intake = DailyIntake(title="Oatmeal", energy=136, proteins=4.8, fats=2.8, carbs=24)
+
+        plan = plan_day(intake, product_ids=[self.oatmeal.pk, self.juice.pk])
+
+        self.assertEqual(plan["dishes"], [(self.oatmeal, 200)])
+        self.assertEqual(plan["totals"]["energy"], 136)
+        self.assertEqual(plan["candidates"], 2)
+
+    def test_plan_max_weight(self):
+        plan = plan_day(self.intake, max_weight=300)
+
+        # 2000 kcal need more than 300 g of either product
+        self.assertEqual(max(weight for _, weight in plan["dishes"]), 300)
+
+    def test_plan_zero_targets(self):
+        plan = plan_day(DailyIntake(title="Fasting", energy=0, proteins=0, fats=0, carbs=0))
+
+        self.assertEqual(plan["dishes"], [])
+        self.assertEqual(plan["totals"]["energy"], 0)
+
+    def test_plan_no_candidates(self):
+        plan = plan_day(self.intake, product_ids=[0])
+
+        self.assertEqual((plan["dishes"], plan["candidates"]), ([], 0))
+        self.assertEqual(plan["totals"]["energy"], 0)
+
+    def test_plan_lactose_free_only(self):
+        plan = plan_day(self.intake, lactose_free_only=True)
+
+        self.assertEqual(plan["candidates"], 1)
+        self.assertEqual([product for product, _ in plan["dishes"]], [self.oatmeal])
+
+    def test_save_meal_plan(self):
+        date = datetime.date(2024, 3, 1)
+        self.log(date, (self.juice, 100))
+
+        meal = save_meal_plan(date, self.breakfast, [(self.oatmeal, 150), (self.juice, 200)],
+                              daily_intake=self.intake, time=datetime.time(9))
+
+        self.assertEqual(meal.day.date, date)
+        self.assertEqual(meal.title, self.breakfast)
+        self.assertEqual(sorted(meal.dish_set.values_list("weight", "energy")), [(150, 102), (200, 90)])
+        totals = DayTotals.objects.get(day=meal.day)
+        self.assertEqual((totals.energy, totals.dishes_count), (237, 3))
+
+
+class PillAdherenceCacheTests(JournalTestCase):
+
+    def test_new_pills_listed(self):
+        vitamin = Pill.objects.create(title="Vitamin D")
+        TakingPill.objects.create(pill=vitamin, day=self.log(datetime.date(2024, 3, 1)), is_taken=True)
+        self.assertEqual([row["title"] for row in pill_adherence_cache.get()], ["Vitamin D"])
+
+        iron = Pill.objects.create(title="Iron")
+        self.assertEqual([row["title"] for row in pill_adherence_cache.get()], ["Iron", "Vitamin D"])
+
+        iron.title = "Magnesium"
+        iron.save()
+        self.assertEqual([row["title"] for row in pill_adherence_cache.get()], ["Magnesium", "Vitamin D"])
+
+
+class AdminListFilterTests(JournalTestCase):
+
+    def setUp(self):
+        super().setUp()
+        user = get_user_model().objects.create_superuser("admin", "admin@example.com", "password")
+        self.client.force_login(user)
+
+    def choices(self, field_path: str, **params) -> list:
+        response = self.client.get(reverse("admin:foodlog_dish_changelist"), params)
+        list_filter = next(spec for spec in response.context["cl"].filter_specs if spec.field_path == field_path)
+        return [pk for pk, _ in list_filter.lookup_choices]
+
+    def test_latest_days_only(self):
+        for day in range(1, 11):
+            self.log(datetime.date(2024, 3, day), (self.oatmeal, 100))
+        first = Meal.objects.get(day__date=datetime.date(2024, 3, 1))
+
+        def days(pks):
+            return sorted(Meal.objects.filter(pk__in=pks).values_list("day__date__day", flat=True))
+
+        self.assertEqual(days(self.choices("meal")), list(range(4, 11)))
+        self.assertEqual(days(self.choices("meal", meal__id__exact=first.pk)), [1, *range(4, 11)])
+
+    def test_products_of_latest_days_only(self):
+        self.log(datetime.date(2024, 3, 1), (self.juice, 100))
+        rice = Product.objects.create(title="Rice", energy=130, proteins=2.7, fats=0.3, carbs=28)
+        for day in range(2, 10):
+            self.log(datetime.date(2024, 3, day), (self.oatmeal, 100), (rice, 150))
+        Product.objects.create(title="Buckwheat", energy=343, proteins=13.3, fats=3.4, carbs=71.5)
+
+        self.assertEqual(self.choices("product"), [self.oatmeal.pk, rice.pk])
+        self.assertEqual(self.choices("product", product__id__exact=self.juice.pk),
+                         [self.juice.pk, self.oatmeal.pk, rice.pk])
+
+    def test_day_filters_by_date(self):
+        day = self.log(datetime.date.today(), (self.oatmeal, 100))
+        Note.objects.create(day=day, note="Tasty")
+        TakingPill.objects.create(pill=Pill.objects.create(title="Iron"), day=day)
+
+        for model in ("meal", "takingpill", "note"):
+            response = self.client.get(reverse(f"admin:foodlog_{model}_changelist"),
+                                       {"day__date__gte": datetime.date.today().isoformat()})
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.context["cl"].result_count, 1)
+
+
+class ProductCacheTests(JournalTestCase):
+
+    def test_evicted_generation_not_reused(self):
+        products = ProductCache(maxsize=10, alias="default", check_interval=0)
+        self.assertEqual(products.get(self.oatmeal.pk)["energy"], 68)
+        Product.objects.filter(pk=self.oatmeal.pk).update(energy=100)
+        products.invalidate(self.oatmeal.pk)
+
+        # The generation expired or was culled while the entries of earlier generations are still alive
+        cache.delete(ProductCache.GENERATION_KEY)
+
+        other_worker = ProductCache(maxsize=10, alias="default", check_interval=0)
+        self.assertEqual(other_worker.get(self.oatmeal.pk)["energy"], 100)
+
+
+class DefaultIntakeCacheTests(JournalTestCase):
+
+    def test_evicted_version_not_reused(self):
+        worker = DefaultIntakeCache(alias="default", check_interval=0)
+        self.assertEqual(worker.get(), self.intake)
+        other_worker = DefaultIntakeCache(alias="default", check_interval=0)
+        other_worker.get()
+
+        self.intake.default = False
+        self.intake.save()
+        lean = DailyIntake.objects.create(title="Lean", default=True, energy=1800, proteins=120, fats=60, carbs=180)
+        # The version expired or was culled after the change
+        cache.delete(DefaultIntakeCache.VERSION_KEY)
+
+        self.assertEqual(worker.get(), lean)
+        self.assertEqual(other_worker.get(), lean)
+
+
+class JournalExportTests(JournalTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.user = get_user_model().objects.create_superuser("admin", "admin@example.com", "password")
+        self.log(datetime.date(2024, 3, 1), (self.oatmeal, 100), (self.juice, 200))
+
+    def test_wsgi_export(self):
+        self.client.force_login(self.user)
+
+        response = self.client.get(reverse("foodlog:journal-export"), {"format": "csv"})
+
+        self.assertFalse(response.is_async)
+        self.assertEqual(len(b"".join(response.streaming_content).splitlines()), 5)
+
+    async def test_asgi_export_streams_async(self):
+        await self.async_client.aforce_login(self.user)
+
+        response = await self.async_client.get(reverse("foodlog:journal-export"), {"format": "csv"})
+
+        self.assertTrue(response.is_async)
+        content = b"".join([chunk async for chunk in response.streaming_content])
+        self.assertEqual(len(content.splitlines()), 5)
+        self.assertIn(b"dish,2024-03-01,08:00:00,Oatmeal,100,68.0", content)
+
+
+class QueryTimingMiddlewareTests(JournalTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.user = get_user_model().objects.create_superuser("admin", "admin@example.com", "password")
+        self.log(datetime.date(2024, 3, 1), (self.oatmeal, 100))
+
+    def test_no_header_by_default(self):
+        self.assertNotIn("Server-Timing", self.client.get(reverse("admin:login")).headers)
+
+    @override_settings(QUERY_TIMING_HEADER=True)
+    def test_header(self):
+        self.client.force_login(self.user)
+
+        response = self.client.get(reverse("admin:foodlog_day_changelist"))
+
+        self.assertRegex(response.headers["Server-Timing"], r'^db;dur=[\d.]+;desc="\d+ queries", view;dur=')
+
+    async def test_async_chain(self):
+        async def get_response(request):
+            return HttpResponse(await Day.objects.acount())
+
+        middleware = QueryTimingMiddleware(get_response)
+        self.assertTrue(iscoroutinefunction(middleware))
+
+        with self.assertLogs("foodlog.middleware", "INFO") as logs:
+            response = await middleware(RequestFactory().get("/"))
+
+        self.assertEqual(response.content, b"1")
+        # The query ran in a thread of sync_to_async() and is still counted
+        self.assertEqual(json.loads(logs.records[0].getMessage())["queries"], 1)
+
+
+class NutritionStatsTests(JournalTestCase):
+
+    def test_moving_average_skips_gaps(self):
+        for date in (datetime.date(2024, 1, 10), datetime.date(2024, 3, 10), datetime.date(2024, 4, 10)):
+            self.log(date, (self.oatmeal, 100))
+        self.log(datetime.date(2024, 4, 11), (self.oatmeal, 200))
+
+        rows = nutrition_stats("month", window=2)
+
+        self.assertEqual([row["period"].month for row in rows], [1, 3, 4])
+        self.assertEqual([row["energy_moving"] for row in rows], [None, None, 85.0])
+
+    def test_weeks_and_years(self):
+        for date in (datetime.date(2023, 12, 25), datetime.date(2024, 1, 1), datetime.date(2024, 1, 15)):
+            self.log(date, (self.oatmeal, 100))
+
+        self.assertEqual([row["energy_moving"] for row in nutrition_stats("week", window=2)], [None, 68.0, None])
+        self.assertEqual([row["energy_moving"] for row in nutrition_stats("year", window=2)], [None, 68.0])
@@ -0,0 +1,12 @@
+from django.urls import path
+
+from . import views
+
+app_name = "foodlog"
+
+urlpatterns = [
+    path("stats/db-pool/", views.db_pool_stats, name="db-pool-stats"),
+    path("export/journal/", views.journal_export, name="journal-export"),
+    path("today/", views.today_dashboard, name="today"),
+    path("products/<int:product_id>/similar/", views.similar_products, name="similar-products"),
+]
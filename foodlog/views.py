@@ -1,3 +1,189 @@
-from django.shortcuts import render
+import asyncio
+import datetime
+import os
+from concurrent.futures import ThreadPoolExecutor
 
-# Create your views here.
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.admin.views.decorators import staff_member_required
+from django.core.handlers.asgi import ASGIRequest
+from django.db import close_old_connections, connections
+from django.db.models import Prefetch
+from django.http import HttpResponseBadRequest, JsonResponse, StreamingHttpResponse
+from django.template.response import TemplateResponse
+
+from .caches import default_intake_cache
+from .export import EXPORT_FORMATS, aexport_journal, export_journal
+from .models import ROLLUP_PARAMS, TOTAL_PARAMS, Day, Dish, Meal, Note, TakingPill
+from .similar import product_index
+
+
+@staff_member_required
+def db_pool_stats(request):
+    """
+    Database connection reuse and pool statistics of the worker process serving the request
+    """
+
+    databases = {}
+    for alias in connections:
+        connection = connections[alias]
+        pool = getattr(connection, "pool", None)
+        info = {
+            "vendor": connection.vendor,
+            "conn_max_age": connection.settings_dict["CONN_MAX_AGE"],
+            "pooled": pool is not None,
+        }
+        if pool is not None:
+            stats = pool.get_stats()
+            connections_num = stats.get("connections_num", 0)
+            info.update(
+                stats,
+                in_use=stats.get("pool_size", 0) - stats.get("pool_available", 0),
+                waiting=stats.get("requests_waiting", 0),
+                avg_connect_ms=stats.get("connections_ms", 0) / connections_num if connections_num else None,
+                avg_wait_ms=stats.get("requests_wait_ms", 0) / stats["requests_queued"]
+                if stats.get("requests_queued") else None,
+            )
+        databases[alias] = info
+
+    return JsonResponse({"pid": os.getpid(), "databases": databases})
+
+
+@staff_member_required
+def similar_products(request, product_id: int):
+    """
+    `k` products with the nearest nutrients per 100 g, lactose-free only if `lactose_free=1`
+    """
+
+    try:
+        k = int(request.GET.get("k", 10))
+    except ValueError:
+        return HttpResponseBadRequest("k must be a number")
+    if not 1 <= k <= 100:
+        return HttpResponseBadRequest("k must be between 1 and 100")
+
+    similar = product_index.nearest(product_id, k, lactose_free_only=request.GET.get("lactose_free") == "1")
+    return JsonResponse({"product": product_id, "similar": [
+        {"id": product.pk, "title": product.title, "distance": round(distance, 4),
+         "lactose_free": product.lactose_free, **{param: getattr(product, param) for param in ROLLUP_PARAMS}}
+        for product, distance in similar
+    ]})
+
+
+@staff_member_required
+def journal_export(request):
+    """
+    Stream the journal for `from`..`to` dates as NDJSON or CSV (`format`), gzipped if `gzip=1`
+    """
+
+    export_format = request.GET.get("format", "ndjson")
+    if export_format not in EXPORT_FORMATS:
+        return HttpResponseBadRequest(f"Unknown format: {export_format}")
+    try:
+        date_from, date_to = (
+            datetime.date.fromisoformat(request.GET[param]) if request.GET.get(param) else None
+            for param in ("from", "to")
+        )
+    except ValueError:
+        return HttpResponseBadRequest("Dates must be YYYY-MM-DD")
+    compress = request.GET.get("gzip") == "1"
+
+    content_type, extension = EXPORT_FORMATS[export_format]
+    filename = f"journal.{extension}"
+    if compress:
+        content_type, filename = "application/gzip", f"{filename}.gz"
+
+    # The ASGI handler reads a sync iterator whole before sending it, an async one is sent chunk by chunk
+    export = aexport_journal if isinstance(request, ASGIRequest) else export_journal
+    response = StreamingHttpResponse(export(date_from, date_to, export_format, compress), content_type=content_type)
+    response["Content-Disposition"] = f'attachment; filename="{filename}"'
+    return response
+
+
+# Threads of the dashboard loaders. Each keeps its own database connection, so the executor is small
+# and dedicated: the default one has up to 32 threads, each could hold an idle persistent connection.
+_loader_executor = ThreadPoolExecutor(max_workers=settings.TODAY_LOADER_THREADS, thread_name_prefix="foodlog-loader")
+
+
+def _in_own_thread(load):
+    """
+    Run the loader in a loader thread with its own database connection, so loaders run concurrently.
+
+    The async ORM runs every query in the single thread of the request, one after another.
+    """
+
+    def run(*args):
+        try:
+            return load(*args)
+        finally:
+            close_old_connections()
+
+    return sync_to_async(run, thread_sensitive=False, executor=_loader_executor)
+
+
+@_in_own_thread
+def _load_day(date: datetime.date) -> Day | None:
+    return Day.objects.select_related("daily_intake").filter(date=date).first()
+
+
+@_in_own_thread
+def _load_meals(date: datetime.date) -> list:
+    return list(
+        Meal.objects.filter(day__date=date)
+        .select_related("title")
+        .prefetch_related(Prefetch("dish_set", queryset=Dish.objects.select_related("product").order_by("id")))
+        .order_by("time", "id")
+    )
+
+
+@_in_own_thread
+def _load_takingpills(date: datetime.date) -> list:
+    return list(TakingPill.objects.filter(day__date=date).select_related("pill").order_by("time", "id"))
+
+
+@_in_own_thread
+def _load_notes(date: datetime.date) -> list:
+    return list(Note.objects.filter(day__date=date).order_by("time", "id"))
+
+
+@_in_own_thread
+def _load_default_intake():
+    return default_intake_cache.get()
+
+
+@staff_member_required
+async def today_dashboard(request):
+    """
+    Meals with dishes, pill takings and notes of today (or `date`) against the daily intake.
+    All sections are loaded concurrently, so the page waits for the slowest query only.
+    """
+
+    try:
+        date = datetime.date.fromisoformat(request.GET["date"]) if request.GET.get("date") else datetime.date.today()
+    except ValueError:
+        return HttpResponseBadRequest("Date must be YYYY-MM-DD")
+
+    day, meals, takingpills, notes, default_intake = await asyncio.gather(
+        _load_day(date), _load_meals(date), _load_takingpills(date), _load_notes(date), _load_default_intake()
+    )
+    intake = day.daily_intake if day and day.daily_intake else default_intake
+    totals = {param: round(sum(getattr(meal, param) for meal in meals), 2) for param in TOTAL_PARAMS}
+    totals["weight"] = sum(meal.weight for meal in meals)
+
+    return TemplateResponse(request, "foodlog/today.html", {
+        "title": f"Day {date}",
+        "date": date,
+        "previous_date": date - datetime.timedelta(days=1),
+        "next_date": date + datetime.timedelta(days=1),
+        "day": day,
+        "meals": meals,
+        "takingpills": takingpills,
+        "notes": notes,
+        "intake": intake,
+        "totals": totals,
+        "progress": [
+            (param, totals[param], getattr(intake, param),
+             round(totals[param] / getattr(intake, param) * 100) if getattr(intake, param) else None)
+            for param in TOTAL_PARAMS
+        ] if intake else [],
+    })
@@ -0,0 +1,41 @@
+"""
+Gunicorn configuration for production serving.
+
+FOODLOG_SERVER selects the application: "wsgi" (project.wsgi with sync/gthread workers)
+or "asgi" (project.asgi with uvicorn workers). The rest is tuned by FOODLOG_* env vars.
+
+https://docs.gunicorn.org/en/stable/settings.html
+"""
+
+import multiprocessing
+import os
+
+server = os.getenv("FOODLOG_SERVER", "wsgi")
+
+bind = os.getenv("FOODLOG_BIND", "0.0.0.0:8000")
+workers = int(os.getenv("FOODLOG_WORKERS", multiprocessing.cpu_count() * 2 + 1))
+threads = int(os.getenv("FOODLOG_THREADS", "1"))
+
+# Invalidations of cached users, the default daily intake and products reach other workers through the cache
+if workers > 1 and os.getenv("FOODLOG_CACHE_BACKEND", "file") == "locmem":
+    raise RuntimeError("FOODLOG_CACHE_BACKEND=locmem is local to a process, use file or redis with several workers")
+
+if server == "asgi":
+    wsgi_app = "project.asgi:application"
+    worker_class = "uvicorn_worker.UvicornWorker"
+else:
+    wsgi_app = "project.wsgi:application"
+    worker_class = "gthread" if threads > 1 else "sync"
+
+# Import Django once in the master, workers are forked with the app already loaded
+preload_app = os.getenv("FOODLOG_PRELOAD", "1") == "1"
+
+# Graceful restarts: HUP or recycling after max_requests lets workers finish requests in flight
+timeout = int(os.getenv("FOODLOG_TIMEOUT", "30"))
+graceful_timeout = int(os.getenv("FOODLOG_GRACEFUL_TIMEOUT", "30"))
+keepalive = int(os.getenv("FOODLOG_KEEPALIVE", "5"))
+max_requests = int(os.getenv("FOODLOG_MAX_REQUESTS", "1000"))
+max_requests_jitter = int(os.getenv("FOODLOG_MAX_REQUESTS_JITTER", "100"))
+
+accesslog = os.getenv("FOODLOG_ACCESS_LOG", "-") or None
+errorlog = "-"
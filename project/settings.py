@@ -43,11 +43,13 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
 ]
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
+    'foodlog.middleware.QueryTimingMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -91,9 +93,95 @@ DATABASES = {
         "PASSWORD": _db_dsn_url.password,
         "HOST": _db_dsn_url.hostname,
         "PORT": _db_dsn_url.port,
+        # Persistent connections: seconds to keep a connection between requests, checked before reuse
+        "CONN_MAX_AGE": int(os.getenv("FOODLOG_DB_CONN_MAX_AGE", "60")),
+        "CONN_HEALTH_CHECKS": os.getenv("FOODLOG_DB_CONN_HEALTH_CHECKS", "1") == "1",
+        "OPTIONS": {},
     }
 }
 
+# Under ASGI every request runs its sync code in another thread, persistent connections would be neither
+# reused nor closed at the end of the request, so they are disabled (the pool below can be used instead).
+# https://docs.djangoproject.com/en/5.1/ref/databases/#persistent-connections
+if os.getenv("FOODLOG_SERVER", "wsgi") == "asgi":
+    DATABASES["default"]["CONN_MAX_AGE"] = 0
+
+# Connection pool of psycopg 3, replaces persistent connections when enabled.
+# Pooled connections are checked before use if CONN_HEALTH_CHECKS is on.
+# https://docs.djangoproject.com/en/5.1/ref/databases/#connection-pool
+if os.getenv("FOODLOG_DB_POOL", "0") == "1":
+    DATABASES["default"]["CONN_MAX_AGE"] = 0
+    DATABASES["default"]["OPTIONS"]["pool"] = {
+        "min_size": int(os.getenv("FOODLOG_DB_POOL_MIN_SIZE", "2")),
+        "max_size": int(os.getenv("FOODLOG_DB_POOL_MAX_SIZE", "10")),
+        "timeout": float(os.getenv("FOODLOG_DB_POOL_TIMEOUT", "10")),
+        "max_idle": float(os.getenv("FOODLOG_DB_POOL_MAX_IDLE", "600")),
+        "max_lifetime": float(os.getenv("FOODLOG_DB_POOL_MAX_LIFETIME", "3600")),
+    }
+
+# Cache: process-local memory, files shared by the workers of one host, or a Redis-compatible server.
+# Cached users, the default daily intake and versions of product caches are invalidated through it,
+# so it must be shared by all workers: locmem is for a single process only (gunicorn refuses it).
+# https://docs.djangoproject.com/en/5.1/topics/cache/
+
+CACHE_BACKENDS = {
+    "locmem": ("django.core.cache.backends.locmem.LocMemCache", "foodlog"),
+    "file": ("django.core.cache.backends.filebased.FileBasedCache", "/tmp/foodlog-cache"),
+    "redis": ("django.core.cache.backends.redis.RedisCache", "redis://localhost:6379/0"),
+}
+CACHE_BACKEND, CACHE_LOCATION = CACHE_BACKENDS[os.getenv("FOODLOG_CACHE_BACKEND", "file")]
+
+CACHES = {
+    "default": {
+        "BACKEND": CACHE_BACKEND,
+        "LOCATION": os.getenv("FOODLOG_CACHE_LOCATION", CACHE_LOCATION),
+        "TIMEOUT": int(os.getenv("FOODLOG_CACHE_TIMEOUT", "300")),
+    }
+}
+
+# Sessions are read from the cache and written through to the database
+SESSION_ENGINE = "django.contrib.sessions.backends.cached_db"
+
+# Users with their permissions are cached too, so authenticated requests need no queries before the view
+AUTHENTICATION_BACKENDS = ["foodlog.auth.CachedModelBackend"]
+AUTH_USER_CACHE_TIMEOUT = int(os.getenv("FOODLOG_AUTH_USER_CACHE_TIMEOUT", "300"))
+
+# Product nutrients cache: process-local LRU, kept coherent between workers by a cache alias
+
+PRODUCT_CACHE_SIZE = int(os.getenv("FOODLOG_PRODUCT_CACHE_SIZE", "10000"))
+PRODUCT_CACHE_ALIAS = os.getenv("FOODLOG_PRODUCT_CACHE_ALIAS", "default") or None
+PRODUCT_CACHE_CHECK_INTERVAL = float(os.getenv("FOODLOG_PRODUCT_CACHE_CHECK_INTERVAL", "1"))
+PRODUCT_CACHE_TIMEOUT = int(os.getenv("FOODLOG_PRODUCT_CACHE_TIMEOUT", "3600"))
+
+# Product similarity index: process-local vectors, updates are announced to other workers by a cache alias
+PRODUCT_INDEX_ALIAS = os.getenv("FOODLOG_PRODUCT_INDEX_ALIAS", "default") or None
+PRODUCT_INDEX_CHECK_INTERVAL = float(os.getenv("FOODLOG_PRODUCT_INDEX_CHECK_INTERVAL", "1"))
+
+# Rendered day tables
+DAY_TABLE_CACHE_ALIAS = os.getenv("FOODLOG_DAY_TABLE_CACHE_ALIAS", "default")
+DAY_TABLE_CACHE_TIMEOUT = int(os.getenv("FOODLOG_DAY_TABLE_CACHE_TIMEOUT", "3600"))
+
+# Threads loading sections of the today dashboard concurrently, each holds a database connection
+TODAY_LOADER_THREADS = int(os.getenv("FOODLOG_TODAY_LOADER_THREADS", "5"))
+
+# Adherence calendar, cached per year
+CALENDAR_CACHE_ALIAS = os.getenv("FOODLOG_CALENDAR_CACHE_ALIAS", "default")
+CALENDAR_CACHE_TIMEOUT = int(os.getenv("FOODLOG_CALENDAR_CACHE_TIMEOUT", "86400"))
+
+# Pill adherence reports
+PILL_ADHERENCE_CACHE_ALIAS = os.getenv("FOODLOG_PILL_ADHERENCE_CACHE_ALIAS", "default")
+PILL_ADHERENCE_CACHE_TIMEOUT = int(os.getenv("FOODLOG_PILL_ADHERENCE_CACHE_TIMEOUT", "86400"))
+
+# Per request query timing: a JSON log line, N+1 warnings and, off by default as any client would see it,
+# the Server-Timing header
+QUERY_TIMING_HEADER = os.getenv("FOODLOG_QUERY_TIMING_HEADER", "0") == "1"
+QUERY_TIMING_SLOWEST = int(os.getenv("FOODLOG_QUERY_TIMING_SLOWEST", "3"))
+QUERY_TIMING_REPEAT_THRESHOLD = int(os.getenv("FOODLOG_QUERY_TIMING_REPEAT_THRESHOLD", "10"))
+
+# Default daily intake
+DEFAULT_INTAKE_CACHE_ALIAS = os.getenv("FOODLOG_DEFAULT_INTAKE_CACHE_ALIAS", "default")
+DEFAULT_INTAKE_CACHE_CHECK_INTERVAL = float(os.getenv("FOODLOG_DEFAULT_INTAKE_CACHE_CHECK_INTERVAL", "1"))
+
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
 